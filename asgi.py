@@ -0,0 +1,118 @@
+import json
+import logging
+import sys
+from tools.ingest import (
+    NOTIFICATION_QUEUE_BACKEND, notification_queue, notification_coalescer,
+    enqueue_notification, ingest_response, approximate_qsize
+)
+
+# Servidor de ingestão do webhook /notification: só valida o JSON, grava na fila
+# e responde. O processamento fica com quem consome a fila (worker.py).
+#
+#   uvicorn asgi:app --workers 4 --no-access-log
+#
+# Com mais de um worker a fila precisa ser a SQLite (NOTIFICATION_QUEUE_BACKEND=sqlite),
+# compartilhada entre os processos pelo arquivo NOTIFICATION_QUEUE_PATH.
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+if NOTIFICATION_QUEUE_BACKEND != 'sqlite':
+    # A fila em memória só existe neste processo: ele mesmo precisa consumi-la
+    logger.warning("Fila em memória: as notificações são processadas neste processo (use um único worker)")
+    import tools.notification  # noqa: F401
+
+MAX_BODY_SIZE = 64 * 1024
+
+
+async def send_json(send, payload, status=200, headers=None):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    raw_headers += [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_SIZE:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def notification(scope, receive, send):
+    if scope['method'] != 'POST':
+        await send_json(send, {"status": "ignored", "message": "Notificação descartada"})
+        return
+
+    raw = await read_body(receive)
+    try:
+        body = json.loads(raw) if raw else None
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        await send_json(send, {"status": "error", "message": "Corpo inválido"}, status=400)
+        return
+
+    try:
+        payload, status, headers = ingest_response(enqueue_notification(body))
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar notificação {body}: {e}")
+        await send_json(send, {"status": "error", "message": "Erro inesperado"}, status=500)
+        return
+    await send_json(send, payload, status, headers)
+
+
+async def queue_size(scope, receive, send):
+    await send_json(send, {
+        "status": "success",
+        "queue_size": approximate_qsize(),
+        "dedup": notification_coalescer.stats(),
+    })
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            logger.info(f"Ingestão iniciada, fila {NOTIFICATION_QUEUE_BACKEND} com {notification_queue.qsize()} itens")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+routes = {
+    '/notification': notification,
+    '/queue_size': queue_size,
+}
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    handler = routes.get(scope['path'].rstrip('/') or '/')
+    if handler is None:
+        await send_json(send, {"status": "error", "message": "Rota não encontrada"}, status=404)
+        return
+    await handler(scope, receive, send)
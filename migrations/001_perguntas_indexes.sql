@@ -0,0 +1,14 @@
+-- Índices para a paginação por cursor de /perguntas (tools/database.get_questions_page).
+-- A chave primária (id) já faz parte de todo índice secundário no InnoDB, então
+-- "ORDER BY loja, data_resposta, id" e "WHERE loja = ? ORDER BY data_resposta, id"
+-- são atendidos sem ordenação em memória, desde que todas as colunas do ORDER BY
+-- tenham a mesma direção (todas ASC ou todas DESC, lidas de trás para frente).
+-- Direções misturadas ("loja ASC, data_resposta DESC") não usam o índice para
+-- ordenar e caem em filesort; por isso tools/database.question_order repete a
+-- direção da coluna escolhida em loja e id. Só data_resposta tem índice: ordenar
+-- por data_pergunta ou item_id ainda ordena em memória.
+--
+--   mysql -h $HOSTGATOR_HOST -u $USER -p $DATABASE < migrations/001_perguntas_indexes.sql
+
+CREATE INDEX idx_perguntas_loja_data_resposta ON perguntas (loja, data_resposta);
+CREATE INDEX idx_perguntas_data_resposta ON perguntas (data_resposta);
@@ -0,0 +1,69 @@
+-- Estatísticas diárias por loja, mantidas por tools/stats.py e servidas em /api/stats.
+-- O dia é o da data da pergunta (data_pergunta), no fuso informado pelo Mercado Livre.
+--
+--   mysql -h $HOSTGATOR_HOST -u $USER -p $DATABASE < migrations/002_perguntas_stats.sql
+
+CREATE TABLE IF NOT EXISTS perguntas_stats_diarias (
+    loja VARCHAR(32) NOT NULL,
+    dia DATE NOT NULL,
+    recebidas INT NOT NULL DEFAULT 0,
+    respondidas INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (loja, dia)
+);
+
+-- Histograma do tempo entre a pergunta e a resposta; faixa é o índice de
+-- RESPONSE_TIME_BUCKETS em tools/stats.py (até 1, 5, 15, 30, 60, 120, 240, 480,
+-- 1440 minutos e acima disso)
+CREATE TABLE IF NOT EXISTS perguntas_stats_tempo (
+    loja VARCHAR(32) NOT NULL,
+    dia DATE NOT NULL,
+    faixa TINYINT NOT NULL,
+    total INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (loja, dia, faixa)
+);
+
+CREATE TABLE IF NOT EXISTS perguntas_stats_categorias (
+    loja VARCHAR(32) NOT NULL,
+    dia DATE NOT NULL,
+    categoria VARCHAR(64) NOT NULL,
+    total INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (loja, dia, categoria)
+);
+
+-- Carga inicial a partir das perguntas já gravadas. Perguntas antigas só existem
+-- na tabela depois de respondidas, então recebidas = respondidas, e a categoria
+-- não foi registrada. Rodar uma única vez, com o bot parado.
+INSERT INTO perguntas_stats_diarias (loja, dia, recebidas, respondidas)
+SELECT loja, DATE(LEFT(data_pergunta, 10)), COUNT(*), COUNT(*)
+FROM perguntas
+GROUP BY loja, DATE(LEFT(data_pergunta, 10))
+ON DUPLICATE KEY UPDATE recebidas = VALUES(recebidas), respondidas = VALUES(respondidas);
+
+INSERT INTO perguntas_stats_tempo (loja, dia, faixa, total)
+SELECT loja, dia, faixa, COUNT(*)
+FROM (
+    SELECT loja,
+           DATE(LEFT(data_pergunta, 10)) AS dia,
+           CASE
+               WHEN minutos <= 1 THEN 0
+               WHEN minutos <= 5 THEN 1
+               WHEN minutos <= 15 THEN 2
+               WHEN minutos <= 30 THEN 3
+               WHEN minutos <= 60 THEN 4
+               WHEN minutos <= 120 THEN 5
+               WHEN minutos <= 240 THEN 6
+               WHEN minutos <= 480 THEN 7
+               WHEN minutos <= 1440 THEN 8
+               ELSE 9
+           END AS faixa
+    FROM (
+        SELECT loja, data_pergunta,
+               TIMESTAMPDIFF(SECOND,
+                   STR_TO_DATE(LEFT(data_pergunta, 19), '%Y-%m-%dT%H:%i:%s'),
+                   STR_TO_DATE(LEFT(data_resposta, 19), '%Y-%m-%dT%H:%i:%s')) / 60 AS minutos
+        FROM perguntas
+    ) AS tempos
+    WHERE minutos IS NOT NULL
+) AS faixas
+GROUP BY loja, dia, faixa
+ON DUPLICATE KEY UPDATE total = VALUES(total);
@@ -0,0 +1,20 @@
+-- data_pergunta e data_resposta passam de texto ISO 8601 (como vem do Mercado Livre,
+-- ex. 2024-05-10T14:32:07.000-04:00) para DATETIME. Fica a hora local do vendedor,
+-- a mesma exibida em /perguntas; o fuso é descartado. Os índices de 001 são mantidos.
+-- Rodar depois de 002, cujo preenchimento inicial lê as datas como texto.
+--
+--   mysql -h $HOSTGATOR_HOST -u $USER -p $DATABASE < migrations/003_perguntas_datetime.sql
+--
+-- Linhas que não seguem o formato fazem o ALTER falhar; para conferir antes:
+--   SELECT id, data_pergunta, data_resposta FROM perguntas
+--   WHERE data_pergunta NOT REGEXP '^[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}'
+--      OR data_resposta NOT REGEXP '^[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}';
+
+UPDATE perguntas
+SET data_pergunta = REPLACE(LEFT(data_pergunta, 19), 'T', ' '),
+    data_resposta = REPLACE(LEFT(data_resposta, 19), 'T', ' ')
+WHERE data_pergunta LIKE '%T%' OR data_resposta LIKE '%T%';
+
+ALTER TABLE perguntas
+    MODIFY data_pergunta DATETIME NULL,
+    MODIFY data_resposta DATETIME NULL;
@@ -0,0 +1,14 @@
+-- Perguntas já contadas em perguntas_stats_diarias.recebidas. tools/stats.py insere o
+-- id com INSERT IGNORE na mesma transação em que soma o contador, então reinícios,
+-- reprocessamentos e vários workers contam cada pergunta uma vez só. Linhas com mais
+-- de STATS_RECEIVED_RETENTION_DAYS dias são apagadas pelo próprio tools/stats.py.
+--
+--   mysql -h $HOSTGATOR_HOST -u $USER -p $DATABASE < migrations/004_perguntas_recebidas.sql
+
+CREATE TABLE IF NOT EXISTS perguntas_recebidas (
+    question_id BIGINT NOT NULL,
+    loja VARCHAR(32) NOT NULL,
+    dia DATE NOT NULL,
+    PRIMARY KEY (question_id),
+    KEY idx_perguntas_recebidas_dia (dia)
+);
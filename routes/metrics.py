@@ -0,0 +1,52 @@
+from flask import Response
+from tools.ingest import approximate_qsize
+from tools.worker_stats import read_worker_stats
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+
+def render_worker_metrics():
+    # As métricas do processamento vêm do retrato publicado pelo consumidor (worker.py);
+    # sem ele, só o tamanho da fila, lido direto do arquivo da fila
+    worker = read_worker_stats()
+    if worker is None:
+        return (
+            '# HELP notification_queue_size Notificações na fila ainda não confirmadas\n'
+            '# TYPE notification_queue_size gauge\n'
+            f'notification_queue_size {approximate_qsize()}\n'
+            '# HELP worker_stats_up Se há estatísticas publicadas pelo consumidor da fila\n'
+            '# TYPE worker_stats_up gauge\n'
+            'worker_stats_up 0\n'
+        )
+    return worker['metrics'] + (
+        '# HELP worker_stats_up Se há estatísticas publicadas pelo consumidor da fila\n'
+        '# TYPE worker_stats_up gauge\n'
+        'worker_stats_up 1\n'
+        '# HELP worker_stats_age_seconds Idade do retrato publicado pelo consumidor da fila\n'
+        '# TYPE worker_stats_age_seconds gauge\n'
+        f'worker_stats_age_seconds {worker["stats_age"]:.3f}\n'
+    )
+
+
+def init_metrics_routes(app):
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        try:
+            return Response(render_worker_metrics(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+        except Exception as e:
+            logger.error(f"Erro ao gerar métricas: {e}")
+            return Response('Erro ao gerar métricas\n', status=500, mimetype='text/plain')
+
+    return app
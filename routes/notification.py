@@ -1,5 +1,6 @@
 from flask import request, jsonify
-from tools.notification import notification_queue
+from tools.ingest import NOTIFICATION_QUEUE_BACKEND, notification_queue, enqueue_notification, ingest_response, notification_coalescer
+from tools.worker_stats import read_worker_stats
 import traceback
 import logging
 import sys
@@ -16,18 +17,23 @@ logger.addHandler(stderr_handler)
 if len(logger.handlers) > 1:
     logger.handlers = [stderr_handler]
 
+# As notificações são processadas por worker.py; o Flask só grava na fila e lê as
+# estatísticas publicadas pelo consumidor (tools/worker_stats.py)
+if NOTIFICATION_QUEUE_BACKEND != 'sqlite':
+    # A fila em memória só existe neste processo: ele mesmo precisa consumi-la
+    logger.warning("Fila em memória: as notificações são processadas neste processo (use um único worker)")
+    import tools.notification  # noqa: F401
+
 def init_notification_routes(app):
 
     @app.route('/notification', methods=['GET', 'POST'])
     def notificationPage():
         if request.method == 'POST':
-            logger.info("Recebida requisição POST para /notification")
             try:
                 body = request.json
-                logger.info(f"Corpo da requisição: {body}")
-                notification_queue.put(body)
-                logger.info("Notificação enfileirada com sucesso")
-                return jsonify({"status": "success", "message": "Notificação recebida e enfileirada"}), 200
+                logger.debug(f"Corpo da requisição: {body}")
+                payload, status_code, headers = ingest_response(enqueue_notification(body))
+                return jsonify(payload), status_code, headers
             except Exception as e:
                 logger.error(f"Ocorreu um erro inesperado: {e}")
                 traceback.print_exc()
@@ -40,6 +46,10 @@ def init_notification_routes(app):
     def queue_size():
         size = notification_queue.qsize()
         logger.info(f"Tamanho atual da fila: {size}")
-        return jsonify({"status": "success", "queue_size": size}), 200
+        worker = read_worker_stats() or {}
+        worker.pop('metrics', None)
+        # Repetições descartadas na ingestão (deste processo) e junções feitas pelo consumidor
+        dedup = dict(worker.pop('dedup', {}), duplicates=notification_coalescer.stats()['duplicates'])
+        return jsonify({"status": "success", "queue_size": size, "dedup": dedup, **worker}), 200
 
     return app
@@ -0,0 +1,49 @@
+from datetime import date, timedelta
+from flask import request, jsonify
+import mysql.connector
+from routes.views import login_required
+from tools.database import parse_date
+from tools.stats import get_daily_stats
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Período máximo de uma consulta, para manter a resposta pequena
+STATS_MAX_DAYS = 366
+
+
+def init_stats_routes(app):
+
+    @app.route('/api/stats', methods=['GET'])
+    @login_required
+    def daily_stats():
+        # Estatísticas por loja e dia; sem período informado, os últimos 30 dias
+        date_to = parse_date(request.args.get('date_to')) or date.today()
+        date_from = parse_date(request.args.get('date_from')) or date_to - timedelta(days=29)
+        if date_from > date_to or (date_to - date_from).days >= STATS_MAX_DAYS:
+            return jsonify({"status": "error", "message": f"Período inválido (máximo de {STATS_MAX_DAYS} dias)"}), 400
+
+        try:
+            stats = get_daily_stats(date_from, date_to, loja=request.args.get('loja'))
+        except mysql.connector.Error as err:
+            logger.error(f"Erro ao buscar estatísticas: {err}")
+            return jsonify({"status": "error", "message": "Erro ao buscar estatísticas"}), 500
+
+        return jsonify({
+            "status": "success",
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "stats": stats
+        }), 200
+
+    return app
@@ -0,0 +1,120 @@
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.perguntas import DATE_DISPLAY_FORMAT, loja_map, loja_ids, present_questions  # noqa: E402
+
+# Mede linhas/s da transformação das linhas de /perguntas antes de ser entregue ao template:
+#
+#   python scripts/benchmark_perguntas_render.py -n 50000
+#
+# "antes": datas em texto ISO com fromisoformat e um log por linha, e a loja do filtro
+# encontrada percorrendo loja_map (cópia do código antigo, que não existe mais na rota).
+# "depois": as funções de verdade de routes/perguntas.py (present_questions), com o
+# mapa reverso pré-calculado e um único log resumido. Importar a rota carrega o .env
+# e abre o pool do MySQL, como o app.
+
+logger = logging.getLogger('benchmark_perguntas')
+logger.setLevel(logging.INFO)
+# Os logs são formatados e escritos de verdade, como no servidor, mas em /dev/null
+devnull_handler = logging.StreamHandler(open(os.devnull, 'w'))
+devnull_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+logger.addHandler(devnull_handler)
+logger.propagate = False
+
+
+def make_rows(total, as_datetime):
+    base = datetime(2024, 1, 1, 8, 0, 0)
+    rows = []
+    for index in range(total):
+        asked = base + timedelta(minutes=random.randint(0, 500000))
+        answered = asked + timedelta(minutes=random.randint(1, 600))
+        rows.append({
+            'id': index,
+            'loja': random.choice(list(loja_map)),
+            'pergunta': 'Tem na cor branca?',
+            'data_pergunta': asked if as_datetime else asked.strftime('%Y-%m-%dT%H:%M:%S.000-04:00'),
+            'item_id': f'MLB{index}',
+            'resposta': 'Olá! Temos sim.',
+            'data_resposta': answered if as_datetime else answered.strftime('%Y-%m-%dT%H:%M:%S.000-04:00'),
+            'id_cliente': index,
+        })
+    return rows
+
+
+def format_date_before(date_str):
+    try:
+        date_obj = datetime.fromisoformat(date_str)
+        formatted_date = date_obj.strftime(DATE_DISPLAY_FORMAT)
+        logger.info(f"Data formatada com sucesso: {formatted_date}")
+        return formatted_date
+    except ValueError as e:
+        logger.warning(f"Erro ao formatar data: {date_str}, erro: {e}")
+        return date_str
+
+
+def render_before(rows, sort_by_name):
+    sort_by_id = None
+    for key, value in loja_map.items():
+        if value == sort_by_name:
+            sort_by_id = key
+            break
+    logger.info(f"Número de perguntas recuperadas: {len(rows)}")
+    for result in rows:
+        result['data_pergunta'] = format_date_before(result['data_pergunta'])
+        result['data_resposta'] = format_date_before(result['data_resposta'])
+        result['loja'] = loja_map.get(result['loja'], result['loja'])
+    return sort_by_id
+
+
+def render_after(rows, sort_by_name):
+    sort_by_id = loja_ids.get(sort_by_name)
+    started = time.perf_counter()
+    failures = present_questions(rows)
+    logger.info(f"{len(rows)} perguntas recuperadas e formatadas em {(time.perf_counter() - started) * 1000:.1f} ms")
+    if failures:
+        logger.warning(f"{failures} datas fora do formato esperado exibidas sem formatação")
+    return sort_by_id
+
+
+def measure(render, rows, page_size, repeat):
+    # Melhor de `repeat` rodadas, processando as linhas em páginas como a rota faz
+    best = None
+    for _ in range(repeat):
+        pages = [[dict(row) for row in rows[i:i + page_size]] for i in range(0, len(rows), page_size)]
+        start = time.perf_counter()
+        for page in pages:
+            render(page, 'Oz Shop')
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da formatação das linhas de /perguntas')
+    parser.add_argument('-n', '--rows', type=int, default=20000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    text_rows = make_rows(args.rows, as_datetime=False)
+    datetime_rows = make_rows(args.rows, as_datetime=True)
+
+    before = measure(render_before, text_rows, args.page_size, args.repeat)
+    after_text = measure(render_after, text_rows, args.page_size, args.repeat)
+    after = measure(render_after, datetime_rows, args.page_size, args.repeat)
+    print(f"Linhas: {args.rows} em páginas de {args.page_size} (melhor de {args.repeat})")
+    print(f"Antes  (texto ISO, log por linha):        {before:,.0f} linhas/s")
+    print(f"Depois (texto ISO, log resumido):         {after_text:,.0f} linhas/s ({after_text / before:.1f}x)")
+    print(f"Depois (DATETIME, log resumido):          {after:,.0f} linhas/s ({after / before:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
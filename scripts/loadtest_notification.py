@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import random
+import time
+import aiohttp
+
+# Mede a latência de confirmação do webhook /notification sob rajada:
+#
+#   python scripts/loadtest_notification.py --url http://127.0.0.1:8000/notification -n 5000 -c 100
+#
+# Cada requisição usa um resource diferente para não cair no descarte de repetidas.
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+async def send(session, url, latencies, statuses, semaphore, index, sellers):
+    body = {
+        'resource': f'/questions/loadtest-{index}-{random.getrandbits(32)}',
+        'user_id': random.randint(1, sellers),
+        'topic': 'questions',
+        'application_id': 0,
+        'attempts': 1,
+        'sent': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'received': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            async with session.post(url, json=body) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+        except aiohttp.ClientError as e:
+            statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+            return
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(url, total, concurrency, sellers):
+    latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            send(session, url, latencies, statuses, semaphore, index, sellers) for index in range(total)
+        ))
+        elapsed = time.perf_counter() - start
+    return sorted(latencies), statuses, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do webhook /notification')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/notification')
+    parser.add_argument('-n', '--requests', type=int, default=2000)
+    parser.add_argument('-c', '--concurrency', type=int, default=50)
+    parser.add_argument('--sellers', type=int, default=20, help='user_ids distintos nas notificações')
+    args = parser.parse_args()
+
+    latencies, statuses, elapsed = asyncio.run(run(args.url, args.requests, args.concurrency, args.sellers))
+    print(f"Requisições: {args.requests} em {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    print(f"Status: {statuses}")
+    print(
+        f"Latência (ms): p50={percentile(latencies, 0.5) * 1000:.2f} "
+        f"p99={percentile(latencies, 0.99) * 1000:.2f} max={percentile(latencies, 1.0) * 1000:.2f}"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import sys
+from tools.cache import TTLCache
+from tools.text import normalize
+
+try:
+    import numpy as np
+except ImportError:  # sem numpy o cache funciona só com perguntas idênticas
+    np = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', str(7 * 86400)))
+ANSWER_CACHE_MAXSIZE = int(os.getenv('ANSWER_CACHE_MAXSIZE', '20000'))
+# Similaridade de cosseno mínima entre perguntas para reaproveitar a resposta
+ANSWER_SIMILARITY_THRESHOLD = float(os.getenv('ANSWER_SIMILARITY_THRESHOLD', '0.9'))
+# Perguntas guardadas por item para a busca por similaridade; acima disso saem as mais antigas
+ANSWER_CACHE_MAX_PER_ITEM = int(os.getenv('ANSWER_CACHE_MAX_PER_ITEM', '200'))
+# A cada tantas inserções os índices de todos os itens descartam as perguntas vencidas
+ANSWER_CACHE_PRUNE_EVERY = 1000
+
+# As respostas são reaproveitadas entre compradores: o nome de quem perguntou é
+# guardado como marcador e trocado pelo nome do comprador atual na leitura
+NAME_PLACEHOLDER = '{cliente}'
+# Saudação no início das respostas carregadas do banco, onde o nome do comprador não é conhecido
+_GREETING = re.compile(r'^\s*(olá|ola|oi|bom dia|boa tarde|boa noite)\b[^.!?\n]*[.!?,]\s*', re.IGNORECASE)
+
+NGRAM_SIZE = 3
+VECTOR_DIM = 4096
+
+
+def _ngrams(text):
+    padded = f' {text} '
+    return [padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)]
+
+
+def strip_name(answer, name):
+    if not name:
+        return answer
+    return re.sub(rf'\b{re.escape(name)}\b', NAME_PLACEHOLDER, answer, flags=re.IGNORECASE)
+
+
+def strip_greeting(answer):
+    stripped = _GREETING.sub('', answer, count=1)
+    return stripped[:1].upper() + stripped[1:] if stripped else answer
+
+
+def fill_name(answer, name):
+    if NAME_PLACEHOLDER not in answer:
+        return answer
+    if name:
+        return answer.replace(NAME_PLACEHOLDER, name)
+    # Sem nome: "Olá, {cliente}! Sim" vira "Olá! Sim"
+    text = re.sub(r'\s+([,.!?])', r'\1', answer.replace(NAME_PLACEHOLDER, ''))
+    text = re.sub(r',\s*([.!?])', r'\1', text)
+    return re.sub(r' {2,}', ' ', text).strip()
+
+
+def _to_timestamp(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def _vectorize(text):
+    # Contagem de n-gramas de caracteres com hashing em dimensão fixa
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for ngram in _ngrams(text):
+        vector[zlib.crc32(ngram.encode('utf-8')) % VECTOR_DIM] += 1.0
+    return vector
+
+
+class _ItemIndex:
+    # Perguntas já respondidas de um item (no máximo max_entries, as mais recentes),
+    # com a matriz TF-IDF montada sob demanda na primeira busca depois de uma mudança
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_PER_ITEM):
+        self.max_entries = max_entries
+        self.questions = []
+        self.answers = []
+        self.expires = []
+        self._vectors = []
+        self._matrix = None
+        self._idf = None
+
+    def add(self, question, answer, expires_at):
+        # Só acrescenta às listas; os vetores são calculados e empilhados em _build
+        self.questions.append(question)
+        self.answers.append(answer)
+        self.expires.append(expires_at)
+        self._vectors.append(None)
+        if len(self.questions) > self.max_entries:
+            del self.questions[0], self.answers[0], self.expires[0], self._vectors[0]
+        self._matrix = None
+
+    def prune(self, now):
+        alive = [i for i, expires_at in enumerate(self.expires) if expires_at > now]
+        if len(alive) == len(self.expires):
+            return
+        self.questions = [self.questions[i] for i in alive]
+        self.answers = [self.answers[i] for i in alive]
+        self.expires = [self.expires[i] for i in alive]
+        self._vectors = [self._vectors[i] for i in alive]
+        self._matrix = None
+
+    def _build(self):
+        self._vectors = [vector if vector is not None else _vectorize(question)
+                         for question, vector in zip(self.questions, self._vectors)]
+        counts = np.vstack(self._vectors)
+        document_frequency = (counts > 0).sum(axis=0)
+        self._idf = np.log((1 + len(self.questions)) / (1 + document_frequency)).astype(np.float32) + 1.0
+        matrix = counts * self._idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self._matrix = matrix / norms
+
+    def most_similar(self, question):
+        if not self.questions:
+            return None, 0.0
+        if self._matrix is None:
+            self._build()
+        vector = _vectorize(question) * self._idf
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None, 0.0
+        scores = self._matrix @ (vector / norm)
+        best = int(np.argmax(scores))
+        return self.answers[best], float(scores[best])
+
+
+class AnswerCache:
+    # Respostas já postadas, por (item_id, pergunta normalizada), com busca
+    # opcional por perguntas parecidas do mesmo item
+
+    def __init__(self, ttl=ANSWER_CACHE_TTL, maxsize=ANSWER_CACHE_MAXSIZE, threshold=ANSWER_SIMILARITY_THRESHOLD):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.similar_hits = 0
+        self.max_items = maxsize
+        self._exact = TTLCache('answers', maxsize=maxsize, ttl=ttl)
+        # Índices por item, do menos para o mais recentemente alimentado; itens que
+        # ninguém mais consulta saem na limpeza periódica ou pelo limite max_items
+        self._items = OrderedDict()
+        self._adds = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, item_id, question, client_name=None):
+        # client_name: nome do comprador atual, no lugar do marcador da resposta guardada
+        normalized = normalize(question)
+        answer = self._exact.get((item_id, normalized))
+        if answer is not None or np is None:
+            return fill_name(answer, client_name) if answer is not None else None
+
+        with self._lock:
+            index = self._items.get(item_id)
+            if index is None:
+                return None
+            index.prune(time.time())
+            if not index.questions:
+                del self._items[item_id]
+                return None
+            answer, score = index.most_similar(normalized)
+            if answer is None or score < self.threshold:
+                return None
+            self.similar_hits += 1
+        logger.info(f"Resposta reaproveitada de pergunta similar do item {item_id} (similaridade {score:.2f})")
+        return fill_name(answer, client_name)
+
+    def add(self, item_id, question, answer, expires_at=None, client_name=None):
+        # client_name: comprador que recebeu a resposta; o nome dele não fica no cache
+        normalized = normalize(question)
+        if not normalized or not answer:
+            return
+        answer = strip_name(answer, client_name)
+        expires_at = expires_at or time.time() + self.ttl
+        if expires_at <= time.time():
+            return
+        self._exact.set((item_id, normalized), answer, ttl=expires_at - time.time())
+        with self._lock:
+            index = self._items.get(item_id)
+            if index is None:
+                index = self._items[item_id] = _ItemIndex()
+            else:
+                self._items.move_to_end(item_id)
+            index.add(normalized, answer, expires_at)
+            if len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+            self._adds += 1
+            if self._adds % ANSWER_CACHE_PRUNE_EVERY == 0:
+                self._prune_items(time.time())
+
+    def _prune_items(self, now):
+        # Chamado com self._lock
+        for item_id in list(self._items):
+            index = self._items[item_id]
+            index.prune(now)
+            if not index.questions:
+                del self._items[item_id]
+
+    def invalidate_item(self, item_id):
+        # O anúncio mudou: as respostas antigas podem não valer mais
+        with self._lock:
+            index = self._items.pop(item_id, None)
+        if index is not None:
+            for question in index.questions:
+                self._exact.invalidate((item_id, question))
+
+    def load(self, rows):
+        # rows: (item_id, pergunta, resposta, data_resposta) já postadas, da tabela perguntas.
+        # Cada resposta expira ttl segundos depois de ter sido dada, não do carregamento;
+        # a saudação sai porque pode ter o nome de um comprador que não se conhece aqui
+        count = 0
+        for item_id, question, answer, answered_at in rows:
+            answered_ts = _to_timestamp(answered_at)
+            if answered_ts is None or answered_ts + self.ttl <= time.time():
+                continue
+            self.add(item_id, question, strip_greeting(answer), expires_at=answered_ts + self.ttl)
+            count += 1
+        logger.info(f"Cache de respostas carregado com {count} perguntas respondidas")
+
+    def stats(self):
+        stats = self._exact.stats()
+        with self._lock:
+            stats['similar_hits'] = self.similar_hits
+            stats['similar_items'] = len(self._items)
+        return stats
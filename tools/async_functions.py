@@ -0,0 +1,267 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from dotenv import load_dotenv
+from tools import async_http, database
+from tools.rate_limiter import PRIORITY_QUESTIONS
+from tools.functions import (
+    ENRICHMENT_TIMEOUT, ENRICHMENT_DEADLINE, MULTIGET_CHUNK_SIZE, OPENAI_CHAT_URL,
+    item_details_cache, item_description_cache, client_info_cache,
+    received_questions_params, log_received_questions, multiget_params, store_multiget_results,
+    select_item_fields, openai_headers, classification_request, parse_classification,
+    answer_request, parse_answer, classify_and_answer_request, parse_classify_and_answer
+)
+import logging
+import sys
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Versões assíncronas das chamadas de tools/functions.py, usadas com PIPELINE_MODE=asyncio.
+# Cada etapa tem seu limite de chamadas simultâneas no processo inteiro:
+# consultas ao Mercado Livre, chamadas ao GPT, posts de respostas e gravações no banco
+STAGE_LIMITS = {
+    'meli': int(os.getenv('ASYNC_MELI_CONCURRENCY', '32')),
+    'llm': int(os.getenv('ASYNC_LLM_CONCURRENCY', '16')),
+    'post': int(os.getenv('ASYNC_POST_CONCURRENCY', '8')),
+    'db': int(os.getenv('ASYNC_DB_CONCURRENCY', '4')),
+}
+
+# O driver MySQL é síncrono: as gravações rodam neste pool, do tamanho do limite da etapa
+db_executor = ThreadPoolExecutor(max_workers=STAGE_LIMITS['db'], thread_name_prefix='async-db')
+
+_semaphores = {}
+_in_flight = {stage: 0 for stage in STAGE_LIMITS}
+
+
+def _stage(name):
+    # Criados no event loop do async_http, onde todas as corrotinas rodam
+    semaphore = _semaphores.get(name)
+    if semaphore is None:
+        semaphore = _semaphores[name] = asyncio.Semaphore(STAGE_LIMITS[name])
+    return semaphore
+
+
+class _StageSlot:
+    def __init__(self, name):
+        self.name = name
+
+    async def __aenter__(self):
+        await _stage(self.name).acquire()
+        _in_flight[self.name] += 1
+
+    async def __aexit__(self, *exc_info):
+        _in_flight[self.name] -= 1
+        _stage(self.name).release()
+
+
+async def off_loop(func, *args):
+    # Caches com CACHE_DB_PATH, travas e numpy bloqueiam: rodam no executor padrão
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def stage_stats():
+    return {stage: {'in_flight': _in_flight[stage], 'limit': limit} for stage, limit in STAGE_LIMITS.items()}
+
+
+async def get_received_questions(user_id, access_token):
+    logger.info(f'Notificação recebida do usuário: {user_id}')
+    url = "https://api.mercadolibre.com/my/received_questions/search"
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    params = received_questions_params()
+    async with _StageSlot('meli'):
+        response = await async_http.get(url, headers=headers, params=params, priority=PRIORITY_QUESTIONS)
+    log_received_questions(response, url, headers, params)
+    return response
+
+
+async def enrich_questions(questions, access_token):
+    # Mesmo resultado de functions.enrich_questions, com multiget e descrições em paralelo
+    item_ids = list(dict.fromkeys(question['item_id'] for question in questions))
+    client_ids = list(dict.fromkeys(question['from']['id'] for question in questions))
+
+    lookups = [
+        _multiget('items', item_ids, access_token, item_details_cache, select_item_fields),
+        _multiget('users', client_ids, access_token, client_info_cache, None),
+    ] + [get_item_description(item_id, access_token) for item_id in item_ids]
+    tasks = [asyncio.ensure_future(lookup) for lookup in lookups]
+
+    done, pending = await asyncio.wait(tasks, timeout=ENRICHMENT_DEADLINE)
+    if pending:
+        logger.error(f"Prazo de {ENRICHMENT_DEADLINE}s esgotado ao enriquecer {len(pending)} consultas")
+        for task in pending:
+            task.cancel()
+
+    def result(task, default):
+        if task in pending or task.cancelled():
+            return default
+        if task.exception() is not None:
+            logger.error(f"Erro ao enriquecer pergunta: {task.exception()}")
+            return default
+        return task.result()
+
+    items_details = result(tasks[0], {})
+    clients_info = result(tasks[1], {})
+    items_descriptions = {item_id: result(task, "") for item_id, task in zip(item_ids, tasks[2:])}
+
+    extracted_data = []
+    for question in questions:
+        item_id = question['item_id']
+        client_id = question['from']['id']
+        extracted_data.append({
+            "client_id": client_id,
+            "text": question['text'],
+            "item_id": item_id,
+            "question_id": question['id'],
+            "seller_id": question.get('seller_id'),
+            "date_created": question.get('date_created'),
+            "client_info": clients_info.get(client_id, {}),
+            "item_description": items_descriptions.get(item_id, ""),
+            "item_details": items_details.get(item_id, {}),
+        })
+    return extracted_data
+
+
+def _cached_entries(cache, ids):
+    results = {}
+    missing = []
+    for resource_id in ids:
+        cached = cache.get(resource_id)
+        if cached is not None:
+            results[resource_id] = cached
+        else:
+            missing.append(resource_id)
+    return results, missing
+
+
+async def _multiget(resource, ids, access_token, cache, project):
+    results, missing = await off_loop(_cached_entries, cache, ids)
+
+    chunks = await asyncio.gather(*(
+        _fetch_multiget_chunk(resource, missing[i:i + MULTIGET_CHUNK_SIZE], access_token, cache, project)
+        for i in range(0, len(missing), MULTIGET_CHUNK_SIZE)
+    ), return_exceptions=True)
+    for chunk in chunks:
+        if isinstance(chunk, Exception):
+            logger.error(f"Erro no multiget de {resource}: {chunk}")
+            continue
+        results.update(chunk)
+    return results
+
+
+async def _fetch_multiget_chunk(resource, ids, access_token, cache, project):
+    url = f"https://api.mercadolibre.com/{resource}"
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    async with _StageSlot('meli'):
+        response = await async_http.hedged_get(url, headers=headers, params=multiget_params(resource, ids), timeout=ENRICHMENT_TIMEOUT)
+    if response.status_code != 200:
+        logger.error(f"Erro no multiget de {resource} ({len(ids)} ids): {response.status_code}")
+        return {}
+    return await off_loop(store_multiget_results, resource, ids, response.json(), cache, project)
+
+
+async def get_item_description(item_id, access_token):
+    cached = await off_loop(item_description_cache.get, item_id)
+    if cached is not None:
+        return cached
+
+    url = f"https://api.mercadolibre.com/items/{item_id}/description"
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    async with _StageSlot('meli'):
+        response = await async_http.hedged_get(url, headers=headers, timeout=ENRICHMENT_TIMEOUT)
+    if response.status_code == 200:
+        description = response.json().get('plain_text', '')
+        logger.info(f"Descrição do item {item_id} obtida com sucesso")
+        await off_loop(item_description_cache.set, item_id, description)
+        return description
+    logger.error(f"Erro ao obter descrição do item {item_id}: {response.status_code}")
+    return ""
+
+
+async def _chat_completion(data):
+    async with _StageSlot('llm'):
+        response = await async_http.post(OPENAI_CHAT_URL, headers=openai_headers(), json=data)
+    response.raise_for_status()
+    return response.json()
+
+
+async def classify_by_chatgpt(question):
+    data = classification_request(question)
+    try:
+        return parse_classification(await _chat_completion(data), question.get('seller_id'))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Erro ao classificar com GPT-4: {e}")
+        raise
+
+
+async def answer_by_chatgpt(question, classification):
+    data = answer_request(question, classification)
+    try:
+        return parse_answer(await _chat_completion(data), question.get('seller_id'))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Erro ao responder com GPT-4: {e}")
+        raise
+
+
+async def classify_and_answer_by_chatgpt(question):
+    data = classify_and_answer_request(question)
+    try:
+        return parse_classify_and_answer(await _chat_completion(data), question.get('seller_id'))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Erro ao classificar e responder com GPT-4: {e}")
+        raise
+
+
+async def post_to_meli(resource, resposta_gpt, access_token):
+    if not access_token:
+        raise ValueError("ACCESS_TOKEN não definido ou expirado")
+
+    url = "https://api.mercadolibre.com/answers"
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+    data = {
+        "question_id": resource,
+        "text": resposta_gpt
+    }
+
+    async with _StageSlot('post'):
+        response = await async_http.post(url, headers=headers, json=data)
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as http_err:
+        logger.error(f"HTTP error occurred: {http_err}")
+        logger.error(f"Response content: {response.content}")
+        raise
+    logger.info(f"Resposta postada com sucesso para a pergunta {resource}")
+    return response.json()
+
+
+async def store_notification_data(data):
+    # True depois do commit da linha; a espera pelo lote não ocupa thread nem vaga da etapa
+    async with _StageSlot('db'):
+        stored = await asyncio.get_running_loop().run_in_executor(db_executor, database.store_notification_data, data)
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(stored)), database.DB_WRITE_WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.error(f"Gravação não confirmada em {database.DB_WRITE_WAIT_TIMEOUT}s")
+        return False
@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+import aiohttp
+import requests
+from tools.http_client import (
+    HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_BACKOFF_FACTOR, HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT, RETRY_STATUS_CODES, IDEMPOTENT_POST_HOSTS, HTTP_HEDGE_DELAY,
+    default_priority, _hedge_count
+)
+from tools.circuit_breaker import circuit_breakers, is_failure
+from tools.rate_limiter import rate_limiter, RATE_LIMIT_RETRIES
+import json
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Equivalente assíncrono do tools/http_client: um event loop numa thread própria,
+# uma ClientSession do aiohttp compartilhada e as mesmas regras de repetição
+
+
+class Response:
+    # Resposta já lida, com a parte da interface do requests usada pelo projeto
+
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        # Mesma exceção do requests, para que o tratamento de erros não mude
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+_loop = None
+_session = None
+_loop_lock = threading.Lock()
+
+
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_loop():
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=_run_loop, args=(loop,), name='async-pipeline', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def submit(coroutine):
+    # Agenda a corrotina no event loop compartilhado sem esperar; devolve um concurrent.futures.Future
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop())
+
+
+def run(coroutine, timeout=None):
+    # Executa a corrotina no event loop compartilhado e espera o resultado
+    return submit(coroutine).result(timeout)
+
+
+def _get_session():
+    # Criada dentro do event loop, na primeira requisição
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=HTTP_POOL_SIZE, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers={'Connection': 'keep-alive'})
+        logger.info(f"Sessão HTTP assíncrona criada (até {HTTP_POOL_SIZE} conexões por host)")
+    return _session
+
+
+def _retry_delay(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return HTTP_BACKOFF_FACTOR * (2 ** attempt)
+
+
+async def request(method, url, timeout=None, priority=None, **kwargs):
+    # Repete em 429/5xx e falhas de conexão como o urllib3 Retry do http_client:
+    # GET sempre, POST só nos hosts de IDEMPOTENT_POST_HOSTS. Um 429 de host com
+    # cota (rate_limiter) pausa a credencial e é repetido também em POST.
+    retriable = method == 'GET' or urlparse(url).netloc in IDEMPOTENT_POST_HOSTS
+    limit_key = rate_limiter.key_for(url, kwargs.get('headers'))
+    if priority is None:
+        priority = default_priority(method, limit_key)
+    if timeout is not None:
+        kwargs['timeout'] = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=timeout)
+
+    breaker = circuit_breakers.for_url(url)
+
+    attempt = 0
+    throttled = 0
+    while True:
+        # Circuito aberto: CircuitOpenError na hora, sem esperar cota nem conexão
+        if breaker is not None:
+            breaker.allow()
+        # Toda saída depois do allow() precisa registrar um resultado ou liberar a vaga
+        # de sondagem; senão o disjuntor fica meio aberto recusando tudo para sempre
+        recorded = False
+        start = None
+        try:
+            if limit_key:
+                await rate_limiter.acquire_async(limit_key, priority)
+            start = time.monotonic()
+            async with _get_session().request(method, url, **kwargs) as response:
+                content = await response.read()
+                if breaker is not None:
+                    breaker.record(time.monotonic() - start, failed=is_failure(response.status))
+                    recorded = True
+                if limit_key and response.status == 429:
+                    rate_limiter.throttled(limit_key, response.headers.get('Retry-After'))
+                    if throttled < RATE_LIMIT_RETRIES:
+                        # A espera fica por conta do acquire_async da próxima volta
+                        throttled += 1
+                        continue
+                    return Response(str(response.url), response.status, response.headers, content)
+                if not (retriable and response.status in RETRY_STATUS_CODES and attempt < HTTP_RETRIES):
+                    return Response(str(response.url), response.status, response.headers, content)
+                delay = _retry_delay(attempt, response.headers.get('Retry-After'))
+                logger.warning(f"{method} {url} retornou {response.status}, nova tentativa em {delay:.1f}s")
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if breaker is not None and start is not None:
+                breaker.record(time.monotonic() - start, failed=True)
+                recorded = True
+            if not (retriable and attempt < HTTP_RETRIES):
+                raise requests.exceptions.ConnectionError(f"{method} {url}: {e!r}") from e
+            delay = _retry_delay(attempt)
+            logger.warning(f"{method} {url} falhou ({type(e).__name__}: {e}), nova tentativa em {delay:.1f}s")
+        except Exception:
+            # Erro inesperado depois do envio (resposta truncada, por exemplo) conta como falha
+            if breaker is not None and start is not None and not recorded:
+                breaker.record(time.monotonic() - start, failed=True)
+                recorded = True
+            raise
+        finally:
+            # Cancelamento (cópia perdedora de um hedged_get) ou saída antes do envio:
+            # não diz nada sobre o endpoint
+            if breaker is not None and not recorded:
+                breaker.cancelled()
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+async def get(url, **kwargs):
+    return await request('GET', url, **kwargs)
+
+
+async def post(url, **kwargs):
+    return await request('POST', url, **kwargs)
+
+
+async def hedged_get(url, **kwargs):
+    # Como http_client.hedged_get, mas a cópia que perde é cancelada
+    if not HTTP_HEDGE_DELAY:
+        return await get(url, **kwargs)
+    first = asyncio.ensure_future(get(url, **kwargs))
+    done, _ = await asyncio.wait({first}, timeout=HTTP_HEDGE_DELAY)
+    if done:
+        return first.result()
+
+    second = asyncio.ensure_future(get(url, **kwargs))
+    _hedge_count('hedged')
+    pending = {first, second}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        _hedge_count('hedge_won')
+                    return task.result()
+                error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+    raise error
+
+
+async def _close():
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+
+def close_session():
+    if _loop is not None:
+        run(_close(), timeout=5)
@@ -0,0 +1,266 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from tools.metrics import register_cache
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+
+class SQLiteCacheStore:
+    # Armazenamento local opcional para que o cache sobreviva a reinicializações.
+    # Entradas vencidas de uma chave que não é mais consultada são apagadas a cada
+    # purge_every gravações do namespace, para o arquivo não crescer sem limite
+
+    def __init__(self, path, purge_every=1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+            'expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_cache_entries_expires_at ON cache_entries (namespace, expires_at)'
+        )
+        self._conn.commit()
+
+    def get(self, namespace, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                (namespace, str(key))
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at <= time.time():
+            self.delete(namespace, key)
+            return None
+        return json.loads(value), expires_at
+
+    def set(self, namespace, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)',
+                (namespace, str(key), json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            self._conn.commit()
+            writes = self._writes[namespace] = self._writes.get(namespace, 0) + 1
+        if writes % self.purge_every == 0:
+            self.purge(namespace)
+
+    def purge(self, namespace):
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?', (namespace, time.time())
+            )
+            self._conn.commit()
+        if cursor.rowcount:
+            logger.info(f"{cursor.rowcount} entradas vencidas removidas do cache {namespace} em {self.path}")
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', (namespace, str(key)))
+            self._conn.commit()
+
+    def clear(self, namespace):
+        with self._lock:
+            self._conn.execute('DELETE FROM cache_entries WHERE namespace = ?', (namespace,))
+            self._conn.commit()
+
+
+class TTLCache:
+    # Cache LRU limitado em memória, com expiração por TTL e contadores de acerto/erro
+
+    def __init__(self, name, maxsize=1024, ttl=3600, store=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        register_cache(self)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+        if self.store is not None:
+            stored = self.store.get(self.name, key)
+            if stored is not None:
+                value, expires_at = stored
+                with self._lock:
+                    self._insert(key, value, expires_at)
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._insert(key, value, expires_at)
+        if self.store is not None:
+            self.store.set(self.name, key, value, expires_at)
+
+    def _insert(self, key, value, expires_at):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.store is not None:
+            self.store.delete(self.name, key)
+        logger.info(f"Cache {self.name}: chave {key} invalidada")
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.store is not None:
+            self.store.clear(self.name)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class StaleWhileRevalidateCache:
+    # Devolve na hora o último valor carregado; se ele tem mais de ttl segundos,
+    # dispara a renovação em segundo plano (uma por chave) e segue servindo o
+    # valor antigo até a nova carga terminar. loader(key) devolve None em caso de falha.
+    # Depois de uma falha a chave só é recarregada após retry_after segundos (dobrando
+    # a cada falha seguida, até ttl); até lá segue servindo o valor antigo, se houver.
+
+    def __init__(self, name, loader, ttl=300, max_stale=86400, max_workers=2, retry_after=30):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.retry_after = retry_after
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._data = {}
+        self._loading = {}
+        self._failures = {}  # chave -> (falhas seguidas, momento a partir do qual tenta de novo)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'swr-{name}')
+        register_cache(self)
+
+    def get(self, key, wait=0):
+        # Sem nenhum valor em cache, espera até wait segundos pela primeira carga
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and now - entry[1] > self.max_stale:
+                del self._data[key]
+                entry = None
+            if entry is not None and now - entry[1] <= self.ttl:
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+            failure = self._failures.get(key)
+            future = None if failure is not None and now < failure[1] else self._refresh_locked(key)
+
+        if entry is not None:
+            return entry[0]
+        if wait <= 0 or future is None:
+            return None
+        try:
+            return future.result(timeout=wait)
+        except FutureTimeoutError:
+            logger.info(f"Cache {self.name}: carga de {key} ainda em andamento")
+            return None
+
+    def refresh(self, key):
+        # Carga explícita: ignora a espera após falha
+        with self._lock:
+            return self._refresh_locked(key)
+
+    def _refresh_locked(self, key):
+        future = self._loading.get(key)
+        if future is None:
+            future = self._loading[key] = self._executor.submit(self._load, key)
+        return future
+
+    def _load(self, key):
+        try:
+            value = self.loader(key)
+        except Exception as e:
+            logger.error(f"Cache {self.name}: erro ao carregar {key}: {e}")
+            value = None
+        with self._lock:
+            self._loading.pop(key, None)
+            if value is not None:
+                self._data[key] = (value, time.time())
+                self._failures.pop(key, None)
+            else:
+                failures = self._failures.get(key, (0, 0))[0] + 1
+                delay = min(self.ttl, self.retry_after * 2 ** (failures - 1))
+                self._failures[key] = (failures, time.time() + delay)
+                logger.warning(f"Cache {self.name}: nova carga de {key} em {delay:.0f}s")
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._failures.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.stale_hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'failing': len(self._failures),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.stale_hits) / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,154 @@
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Um disjuntor por endpoint: abre depois de BREAKER_FAILURE_THRESHOLD falhas seguidas
+# (erro de conexão, timeout, 5xx ou chamada mais lenta que BREAKER_SLOW_CALL_SECONDS),
+# recusa chamadas por BREAKER_OPEN_SECONDS e então deixa passar uma sondagem por vez
+BREAKER_ENABLED = os.getenv('BREAKER_ENABLED', '1') == '1'
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', '20'))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '30'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Trechos do caminho com dígitos são ids (MLB123, 65131481), exceto a versão da API (v1):
+# /items/MLB1/description -> /items/:id/description
+_ID_SEGMENT = re.compile(r'(?<=/)(?!v\d+(?:/|$))[^/]*\d[^/]*')
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    # Subclasse de ConnectionError para cair no mesmo tratamento de falha de rede
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"Circuito aberto para {endpoint}, nova tentativa em {retry_after:.0f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 slow_call_seconds=BREAKER_SLOW_CALL_SECONDS, open_seconds=BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'opened': 0}
+
+    def allow(self):
+        # Levanta CircuitOpenError sem chamar o serviço quando o circuito está aberto
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self.opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, self.open_seconds)
+                self._probing = True
+            self._stats['calls'] += 1
+
+    def record(self, elapsed, failed):
+        slow = elapsed > self.slow_call_seconds
+        with self._lock:
+            self._stats['slow_calls'] += slow
+            if not (failed or slow):
+                if self.state != CLOSED:
+                    logger.info(f"Circuito de {self.name} fechado")
+                self.state = CLOSED
+                self.failures = 0
+                self._probing = False
+                return
+            self._stats['failures'] += 1
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self._stats['opened'] += 1
+                    logger.warning(
+                        f"Circuito de {self.name} aberto por {self.open_seconds:.0f}s "
+                        f"após {self.failures} falhas ({'lenta' if slow and not failed else 'erro'})"
+                    )
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def cancelled(self):
+        # Chamada interrompida sem resultado: libera a vaga de sondagem
+        with self._lock:
+            self._probing = False
+
+    def open_remaining(self):
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, state=self.state, consecutive_failures=self.failures)
+
+
+class CircuitBreakers:
+    # Disjuntores criados sob demanda, um por host + caminho sem ids
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def for_url(self, url):
+        if not self.enabled:
+            return None
+        parsed = urlparse(url)
+        if not parsed.netloc:
+            return None
+        endpoint = parsed.netloc + _ID_SEGMENT.sub(':id', parsed.path.rstrip('/'))
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(endpoint, CircuitBreaker(endpoint))
+        return breaker
+
+    def open_remaining(self):
+        # Maior tempo até um circuito aberto aceitar nova sondagem
+        return max((breaker.open_remaining() for breaker in list(self._breakers.values())), default=0.0)
+
+    def stats(self):
+        return {endpoint: breaker.stats() for endpoint, breaker in list(self._breakers.items())}
+
+
+def is_failure(status_code):
+    # 4xx é problema da requisição, não do serviço; 429 fica com o rate_limiter
+    return status_code >= 500
+
+
+circuit_breakers = CircuitBreakers(enabled=BREAKER_ENABLED)
@@ -0,0 +1,89 @@
+import os
+import re
+import threading
+import logging
+import sys
+from tools.utils import intentions
+from tools.functions import classify_by_chatgpt
+from tools.text import normalize
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Com LOCAL_CLASSIFIER=0 toda pergunta vai para o GPT, como antes
+LOCAL_CLASSIFIER = os.getenv('LOCAL_CLASSIFIER', '1') == '1'
+# Quantas vezes a pontuação da melhor categoria precisa superar a segunda
+LOCAL_CLASSIFIER_MARGIN = float(os.getenv('LOCAL_CLASSIFIER_MARGIN', '2'))
+
+_stats = {'local': 0, 'fallback': 0}
+_stats_lock = threading.Lock()
+
+
+def build_index(intentions):
+    # Um único regex com todas as palavras-chave, as mais longas primeiro para que
+    # "falar com o vendedor" tenha preferência sobre "falar com"
+    keyword_categories = {}
+    for category, keywords in intentions.items():
+        for keyword in re.split(r'[;,:]', keywords):
+            keyword = normalize(keyword)
+            if keyword:
+                keyword_categories.setdefault(keyword, set()).add(category)
+
+    alternatives = sorted(keyword_categories, key=len, reverse=True)
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(keyword) for keyword in alternatives) + r')\b')
+    return pattern, keyword_categories
+
+
+_pattern, _keyword_categories = build_index(intentions)
+
+
+def classify_locally(text):
+    # Retorna (categoria, confiante); sem nenhuma palavra-chave, a categoria é None
+    scores = {}
+    for match in _pattern.finditer(normalize(text)):
+        for category in _keyword_categories[match.group(0)]:
+            scores[category] = scores.get(category, 0) + 1
+
+    if not scores:
+        return None, False
+
+    ranking = sorted(scores.items(), key=lambda entry: entry[1], reverse=True)
+    best_category, best_score = ranking[0]
+    if len(ranking) == 1:
+        return best_category, True
+    second_score = ranking[1][1]
+    return best_category, best_score >= LOCAL_CLASSIFIER_MARGIN * second_score
+
+
+def classify_question(question, use_llm=True):
+    # Com use_llm=False devolve None quando a classificação local não é confiável
+    if LOCAL_CLASSIFIER:
+        category, confident = classify_locally(question.get('text', ''))
+        if confident:
+            with _stats_lock:
+                _stats['local'] += 1
+            logger.info(f"Classificação local: {category}")
+            return category
+
+    with _stats_lock:
+        _stats['fallback'] += 1
+    return classify_by_chatgpt(question) if use_llm else None
+
+
+def classifier_stats():
+    with _stats_lock:
+        total = _stats['local'] + _stats['fallback']
+        return {
+            'local': _stats['local'],
+            'fallback': _stats['fallback'],
+            'fallback_rate': round(_stats['fallback'] / total, 4) if total else 0.0,
+        }
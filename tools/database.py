@@ -1,8 +1,17 @@
+import base64
+import json
+import os
+from datetime import date, datetime, timedelta
+import threading
+import time
 import logging
 import mysql.connector
-import requests
+from collections import namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from tools import http_client
+from tools.metrics import db_pool_wait
 from mysql.connector import pooling
-from flask import jsonify
 from tools.functions import get_env_variable
 from tools.user_config import user_config, user_config_number
 
@@ -15,44 +24,107 @@ logging.basicConfig(
     ]
 )
 
+# Pool único de conexões usado por todos os módulos (o mysql-connector aceita até 32).
+# Quando todas estão em uso, get_connection espera até DB_POOL_ACQUIRE_TIMEOUT segundos.
+DB_POOL_NAME = os.getenv('DB_POOL_NAME', 'meli_pool')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '5'))
+
+DB_CONFIG = {
+    'host': get_env_variable('HOSTGATOR_HOST'),
+    'port': int(get_env_variable('HOSTGATOR_PORT')),
+    'user': get_env_variable('USER'),
+    'password': get_env_variable('PASSWORD'),
+    'database': get_env_variable('DATABASE'),
+}
+
 pool = pooling.MySQLConnectionPool(
-    host=get_env_variable('HOSTGATOR_HOST'),
-    port=int(get_env_variable('HOSTGATOR_PORT')),
-    user=get_env_variable('USER'),
-    password=get_env_variable('PASSWORD'),
-    database=get_env_variable('DATABASE')
+    pool_name=DB_POOL_NAME,
+    pool_size=DB_POOL_SIZE,
+    pool_reset_session=True,
+    **DB_CONFIG
 )
 
+# O pool do mysql-connector falha na hora quando esgotado; o semáforo faz a espera
+_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+_pool_stats = {'acquired': 0, 'timeouts': 0, 'in_use': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+_pool_stats_lock = threading.Lock()
+
+QueryResult = namedtuple('QueryResult', ['lastrowid', 'rowcount'])
+
+
+@contextmanager
+def get_connection(timeout=DB_POOL_ACQUIRE_TIMEOUT):
+    # Ao retirar a conexão, o pool verifica se ela está viva (ping) e reconecta se
+    # o servidor a tiver fechado; ao sair do bloco a conexão volta para o pool
+    start = time.monotonic()
+    if not _pool_slots.acquire(timeout=timeout):
+        with _pool_stats_lock:
+            _pool_stats['timeouts'] += 1
+        raise mysql.connector.errors.PoolError(f"Nenhuma conexão livre no pool {DB_POOL_NAME} após {timeout}s")
+
+    waited = time.monotonic() - start
+    db_pool_wait.observe(waited)
+    with _pool_stats_lock:
+        _pool_stats['acquired'] += 1
+        _pool_stats['in_use'] += 1
+        _pool_stats['wait_total'] += waited
+        _pool_stats['wait_max'] = max(_pool_stats['wait_max'], waited)
+
+    connection = None
+    try:
+        connection = pool.get_connection()
+        yield connection
+    finally:
+        if connection is not None:
+            try:
+                connection.close()
+            except mysql.connector.Error as error:
+                logging.warning(f"Erro ao devolver conexão ao pool: {error}")
+        with _pool_stats_lock:
+            _pool_stats['in_use'] -= 1
+        _pool_slots.release()
+
+
+def pool_stats():
+    with _pool_stats_lock:
+        acquired = _pool_stats['acquired']
+        return {
+            'size': DB_POOL_SIZE,
+            'in_use': _pool_stats['in_use'],
+            'acquired': acquired,
+            'timeouts': _pool_stats['timeouts'],
+            'avg_wait_ms': round(_pool_stats['wait_total'] / acquired * 1000, 2) if acquired else 0.0,
+            'max_wait_ms': round(_pool_stats['wait_max'] * 1000, 2),
+        }
+
 
 def execute_query(query, params):
+    # Devolve lastrowid e rowcount, lidos antes de o cursor ser fechado
     try:
         logging.info(f"Executando query: {query} com parâmetros: {params}")
-        connection = pool.get_connection()
-        cursor = connection.cursor()
-        cursor.execute(query, params)
-        connection.commit()
-        logging.info("Query executada com sucesso.")
-        return cursor
+        with get_connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                connection.commit()
+                logging.info("Query executada com sucesso.")
+                return QueryResult(cursor.lastrowid, cursor.rowcount)
     except mysql.connector.Error as error:
         logging.error(f"Erro de banco de dados: {error}")
         return None
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
 
 def store_token(refresh_token, access_token, user_id):
     config = user_config.get(user_id)
     if config:
         table = config['table']
         query = f'INSERT INTO {table} (refresh_token, access_token) VALUES (%s, %s)'
-        cursor = execute_query(query, (refresh_token, access_token))
-        if cursor:
+        result = execute_query(query, (refresh_token, access_token))
+        if result:
             logging.info(f"Tokens armazenados com sucesso para user_id: {user_id}")
-            return jsonify({'message': 'Tokens armazenados com sucesso', 'id': cursor.lastrowid}), 200
+            return {'message': 'Tokens armazenados com sucesso', 'id': result.lastrowid}, 200
         else:
             logging.error(f"Erro ao armazenar tokens para user_id: {user_id}")
-            return jsonify({'error': 'Erro ao armazenar tokens'}), 500
+            return {'error': 'Erro ao armazenar tokens'}, 500
 
 def get_access_token(user_id):
     config = user_config.get(user_id)
@@ -61,11 +133,10 @@ def get_access_token(user_id):
         query = f'SELECT access_token FROM {table} ORDER BY id DESC LIMIT 1'
         logging.info(f"Buscando access_token para user_id: {user_id}")
         
-        connection = pool.get_connection()
         try:
-            cursor = connection.cursor()
-            cursor.execute(query, ())
-            result = cursor.fetchone()
+            with get_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(query, ())
+                result = cursor.fetchone()
             if result:
                 logging.info(f"Access token encontrado para user_id: {user_id}")
             else:
@@ -74,10 +145,6 @@ def get_access_token(user_id):
         except mysql.connector.Error as error:
             logging.error(f"Erro de banco de dados: {error}")
             return None
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
     return None
 
 def get_access_token_number(user_id):
@@ -87,11 +154,10 @@ def get_access_token_number(user_id):
         query = f'SELECT access_token FROM {table} ORDER BY id DESC LIMIT 1'
         logging.info(f"Buscando access_token para user_id: {user_id}")
         
-        connection = pool.get_connection()
         try:
-            cursor = connection.cursor()
-            cursor.execute(query, ())
-            result = cursor.fetchone()
+            with get_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(query, ())
+                result = cursor.fetchone()
             if result:
                 logging.info(f"Access token encontrado para user_id: {user_id}")
             else:
@@ -100,10 +166,6 @@ def get_access_token_number(user_id):
         except mysql.connector.Error as error:
             logging.error(f"Erro de banco de dados: {error}")
             return None
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
     return None
 
 def get_refresh_token(user_id):
@@ -117,9 +179,8 @@ def get_refresh_token(user_id):
     query = f'SELECT refresh_token FROM {table} ORDER BY id DESC LIMIT 1'
     logging.info(f"Buscando refresh_token para user_id: {user_id}")
 
-    connection = pool.get_connection()
     try:
-        with connection.cursor() as cursor:
+        with get_connection() as connection, connection.cursor() as cursor:
             cursor.execute(query)
             result = cursor.fetchone()
             if result:
@@ -133,9 +194,6 @@ def get_refresh_token(user_id):
     except mysql.connector.Error as error:
         logging.error(f"Erro de banco de dados ao buscar refresh token: {error}")
         raise  # Repropaga a exceção para alertar sobre falha no banco de dados.
-    finally:
-        if connection.is_connected():
-            connection.close()
 
 def update_tokens(user_id, refresh_token):
     config = user_config.get(user_id)
@@ -153,30 +211,426 @@ def update_tokens(user_id, refresh_token):
         }
 
         logging.info(f"Atualizando tokens para user_id: {user_id} com refresh_token: {refresh_token}")
-        response = requests.post(url, headers=headers, data=data)
+        response = http_client.post(url, headers=headers, data=data)
         if response.status_code == 200:
             tokens = response.json()
             access_token = tokens.get('access_token')
             refresh_token = tokens.get('refresh_token')
             if access_token and refresh_token:
                 logging.info(f"Tokens atualizados com sucesso para user_id: {user_id}")
-                store_token(refresh_token, access_token, user_id)
-                return access_token
+                # O Mercado Livre já invalidou o refresh_token anterior: quem chamou precisa
+                # saber se o novo par ficou gravado para tentar de novo se não ficou
+                _, status = store_token(refresh_token, access_token, user_id)
+                tokens['persisted'] = status == 200
+                return tokens
         else:
             logging.error(f"Erro ao atualizar tokens: {response.status_code} - {response.text}")
         return None
 
+# Erros em que vale repetir a gravação: conexão perdida, pool esgotado, deadlock
+# (1213) e espera por lock (1205)
+TRANSIENT_ERRNOS = (1205, 1213)
+
+def is_transient(error):
+    return isinstance(error, (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError,
+                              mysql.connector.errors.PoolError)) or getattr(error, 'errno', None) in TRANSIENT_ERRNOS
+
+
+def _settle(futures, ok):
+    for future in futures:
+        # O chamador pode ter desistido de esperar (asyncio cancela o Future)
+        if not future.done():
+            future.set_result(ok)
+
+
+class WriteBehindBuffer:
+    # Acumula as linhas de um INSERT e grava com executemany numa única transação
+    # (group commit): a thread de gravação começa um lote assim que há linhas, e as
+    # que chegam durante a gravação formam o próximo, em lotes de até batch_size.
+    # add() devolve um Future que recebe True quando a linha foi confirmada (commit)
+    # e False quando a gravação falhou; com max_pending linhas acumuladas, add()
+    # espera espaço em vez de descartar.
+
+    def __init__(self, name, query, batch_size=50, flush_interval=2.0, max_retries=3):
+        self.name = name
+        self.query = query
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.max_pending = batch_size * 100
+        self._rows = []
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._stats = {'flushes': 0, 'rows': 0, 'failed_rows': 0, 'retries': 0,
+                       'latency_total': 0.0, 'latency_max': 0.0, 'batch_max': 0}
+        self._thread = threading.Thread(target=self._run, name=f'write-behind-{name}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def add(self, params):
+        future = Future()
+        with self._space:
+            if len(self._rows) >= self.max_pending:
+                logging.warning(f"{len(self._rows)} linhas aguardando gravação em {self.name}, esperando espaço")
+            while len(self._rows) >= self.max_pending and not self._stop.is_set():
+                self._space.wait(self.flush_interval)
+            self._rows.append((params, future))
+        self._wake.set()
+        return future
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._space:
+                rows, self._rows = self._rows, []
+                self._space.notify_all()
+            for start in range(0, len(rows), self.batch_size):
+                error = self._write(rows[start:start + self.batch_size])
+                if error is not None:
+                    self._requeue(rows[start:], error)
+                    return
+
+    def _write(self, rows):
+        # rows: [(parâmetros, Future)]. Devolve o erro quando o banco segue indisponível
+        # após as tentativas; nesse caso os Futures continuam pendentes
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            try:
+                with get_connection() as connection, connection.cursor() as cursor:
+                    try:
+                        cursor.executemany(self.query, [params for params, _ in rows])
+                        connection.commit()
+                    except mysql.connector.Error:
+                        connection.rollback()
+                        raise
+                break
+            except mysql.connector.Error as error:
+                if is_transient(error) and attempt < self.max_retries:
+                    logging.warning(f"Erro transitório ao gravar lote de {len(rows)} em {self.name}, nova tentativa: {error}")
+                    with self._lock:
+                        self._stats['retries'] += 1
+                    time.sleep(0.5 * (2 ** attempt))
+                    continue
+                if is_transient(error) and not self._stop.is_set():
+                    return error
+                logging.error(f"Erro ao gravar lote de {len(rows)} em {self.name}: {error}")
+                self._write_one_by_one(rows)
+                return None
+
+        latency = time.monotonic() - started
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['rows'] += len(rows)
+            self._stats['latency_total'] += latency
+            self._stats['latency_max'] = max(self._stats['latency_max'], latency)
+            self._stats['batch_max'] = max(self._stats['batch_max'], len(rows))
+        _settle([future for _, future in rows], True)
+        logging.info(f"{len(rows)} linhas gravadas em {self.name} em {latency * 1000:.1f} ms")
+        return None
+
+    def _requeue(self, rows, error):
+        # Banco indisponível: o lote volta para o início do buffer e é tentado no
+        # próximo flush; o limite de max_pending é aplicado em add(), nada é descartado
+        with self._space:
+            self._rows[:0] = rows
+        logging.error(f"Banco indisponível ao gravar {len(rows)} linhas em {self.name}, "
+                      f"adiadas para o próximo flush: {error}")
+        # Espera antes da próxima tentativa, em vez de voltar a gravar na hora
+        self._stop.wait(self.flush_interval)
+
+    def _write_one_by_one(self, rows):
+        # Isola a linha com problema para não perder o lote inteiro
+        failed = 0
+        for params, future in rows:
+            ok = bool(execute_query(self.query, params))
+            failed += not ok
+            _settle([future], ok)
+        with self._lock:
+            self._stats['rows'] += len(rows) - failed
+            self._stats['failed_rows'] += failed
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        with self._space:
+            self._space.notify_all()
+        self._thread.join(self.flush_interval + 1)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            flushes = self._stats['flushes']
+            return {
+                'pending': len(self._rows),
+                'flushes': flushes,
+                'rows': self._stats['rows'],
+                'failed_rows': self._stats['failed_rows'],
+                'retries': self._stats['retries'],
+                'avg_batch': round(self._stats['rows'] / flushes, 2) if flushes else 0.0,
+                'max_batch': self._stats['batch_max'],
+                'avg_flush_ms': round(self._stats['latency_total'] / flushes * 1000, 2) if flushes else 0.0,
+                'max_flush_ms': round(self._stats['latency_max'] * 1000, 2),
+            }
+
+
+# Com DB_WRITE_BEHIND=0 cada pergunta respondida é gravada na hora, como antes
+DB_WRITE_BEHIND = os.getenv('DB_WRITE_BEHIND', '1') == '1'
+DB_WRITE_BATCH_SIZE = int(os.getenv('DB_WRITE_BATCH_SIZE', '50'))
+DB_WRITE_FLUSH_INTERVAL = float(os.getenv('DB_WRITE_FLUSH_INTERVAL', '2'))
+DB_WRITE_MAX_RETRIES = int(os.getenv('DB_WRITE_MAX_RETRIES', '3'))
+# Espera máxima (segundos) pela confirmação da gravação antes de dar a notificação como falha
+DB_WRITE_WAIT_TIMEOUT = float(os.getenv('DB_WRITE_WAIT_TIMEOUT', '60'))
+
+STORE_NOTIFICATION_QUERY = '''
+    INSERT INTO perguntas (loja, pergunta, data_pergunta, item_id, resposta, data_resposta, id_cliente)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+'''
+
+notification_writer = WriteBehindBuffer(
+    'perguntas',
+    STORE_NOTIFICATION_QUERY,
+    batch_size=DB_WRITE_BATCH_SIZE,
+    flush_interval=DB_WRITE_FLUSH_INTERVAL,
+    max_retries=DB_WRITE_MAX_RETRIES
+)
+if DB_WRITE_BEHIND:
+    # Fechado por tools/notification.shutdown_notification_workers, depois da drenagem dos workers
+    notification_writer.start()
+
+def to_db_datetime(value):
+    # Datas ISO do Mercado Livre para as colunas DATETIME (migrations/003_perguntas_datetime.sql),
+    # mantendo a hora local do vendedor
+    if not isinstance(value, str):
+        return value
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return value
+
 def store_notification_data(data):
-    query = '''
-        INSERT INTO perguntas (loja, pergunta, data_pergunta, item_id, resposta, data_resposta, id_cliente)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-    '''
+    # Devolve um Future com True depois do commit da linha ou False se a gravação falhou;
+    # quem confirma a notificação na fila deve esperar por ele (wait_stored)
     params = (
-        data['seller_id'], data['text'], data['date_created'], data['item_id'],
-        data['answer_text'], data['answer_date_created'], data['from_id']
+        data['seller_id'], data['text'], to_db_datetime(data['date_created']), data['item_id'],
+        data['answer_text'], to_db_datetime(data['answer_date_created']), data['from_id']
     )
-    cursor = execute_query(query, params)
-    if cursor:
+    if DB_WRITE_BEHIND:
+        return notification_writer.add(params)
+    future = Future()
+    if execute_query(STORE_NOTIFICATION_QUERY, params):
         logging.info(f"Notificação armazenada com sucesso: {data}")
+        future.set_result(True)
     else:
         logging.error("Erro ao armazenar notificação")
+        future.set_result(False)
+    return future
+
+def wait_stored(future, timeout=DB_WRITE_WAIT_TIMEOUT):
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        logging.error(f"Gravação não confirmada em {timeout}s")
+        return False
+
+def get_answered_questions(limit):
+    # Perguntas já respondidas mais recentes, para aquecer o cache de respostas
+    query = 'SELECT item_id, pergunta, resposta, data_resposta FROM perguntas ORDER BY data_resposta DESC LIMIT %s'
+    try:
+        with get_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(query, (limit,))
+            result = cursor.fetchall()
+        logging.info(f"{len(result)} perguntas respondidas carregadas")
+        return result
+    except mysql.connector.Error as error:
+        logging.error(f"Erro de banco de dados: {error}")
+        return []
+
+# Colunas aceitas na ordenação de /perguntas; o id desempata linhas com o mesmo valor
+QUESTION_SORT_COLUMNS = ('data_resposta', 'data_pergunta', 'loja', 'item_id')
+QUESTION_COLUMNS = 'id, loja, pergunta, data_pergunta, item_id, resposta, data_resposta, id_cliente'
+QUESTION_PAGE_SIZE = int(os.getenv('QUESTION_PAGE_SIZE', '50'))
+QUESTION_PAGE_MAX = 500
+
+def parse_order_by(order_by, default='data_resposta DESC'):
+    # 'coluna [ASC|DESC]' validado contra QUESTION_SORT_COLUMNS
+    parts = (order_by or '').split()
+    if not parts or parts[0] not in QUESTION_SORT_COLUMNS or len(parts) > 2:
+        parts = default.split()
+    direction = parts[1].upper() if len(parts) == 2 else 'ASC'
+    if direction not in ('ASC', 'DESC'):
+        direction = 'ASC'
+    return parts[0], direction
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+def question_filters(loja=None, date_from=None, date_to=None):
+    # Filtros de loja e período sobre data_resposta (datas, com date_to inclusivo)
+    conditions, params = [], []
+    if loja:
+        conditions.append('loja = %s')
+        params.append(loja)
+    # 'AAAA-MM-DD' é convertido pelo MySQL para comparar com a coluna DATETIME
+    if date_from:
+        conditions.append('data_resposta >= %s')
+        params.append(date_from.isoformat())
+    if date_to:
+        conditions.append('data_resposta < %s')
+        params.append((date_to + timedelta(days=1)).isoformat())
+    return conditions, params
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def question_order(order_by, loja=None):
+    # Sem filtro de loja, as perguntas continuam agrupadas por loja. Todas as colunas
+    # seguem a mesma direção: o MySQL só percorre o índice (loja, data_resposta, id)
+    # de trás para frente se nenhuma coluna inverter a ordem; com "loja ASC,
+    # data_resposta DESC" ele ordenaria a tabela inteira em memória (filesort)
+    column, direction = parse_order_by(order_by)
+    order = [(column, direction), ('id', direction)]
+    if not loja and column != 'loja':
+        order.insert(0, ('loja', direction))
+    return order
+
+def _keyset_equal(column, value):
+    if value is None:
+        return f'{column} IS NULL', []
+    return f'{column} = %s', [value]
+
+def _keyset_after(column, direction, value):
+    # No MySQL NULL vem antes de tudo em ASC e depois de tudo em DESC; com "= NULL"
+    # ou "< NULL" as linhas sem data (migrations/003) sumiriam da paginação.
+    # None: nenhuma linha vem depois de NULL nesta coluna
+    if direction == 'DESC':
+        if value is None:
+            return None, []
+        return f'({column} < %s OR {column} IS NULL)', [value]
+    if value is None:
+        return f'{column} IS NOT NULL', []
+    return f'{column} > %s', [value]
+
+def _keyset_condition(order, values):
+    # (a, b, id) depois do cursor, respeitando a direção de cada coluna:
+    # a > x OR (a = x AND b < y) OR (a = x AND b = y AND id < z) ...
+    alternatives, params = [], []
+    for index, (column, direction) in enumerate(order):
+        after, after_params = _keyset_after(column, direction, values[index])
+        if after is None:
+            continue
+        terms, term_params = [], []
+        for (previous, _), value in zip(order[:index], values):
+            equal, equal_params = _keyset_equal(previous, value)
+            terms.append(equal)
+            term_params.extend(equal_params)
+        terms.append(after)
+        alternatives.append('(' + ' AND '.join(terms) + ')')
+        params.extend(term_params + after_params)
+    if not alternatives:
+        return 'FALSE', []
+    return '(' + ' OR '.join(alternatives) + ')', params
+
+def get_questions_page(loja=None, date_from=None, date_to=None, order_by=None, cursor=None, page_size=QUESTION_PAGE_SIZE):
+    # Paginação por cursor (keyset): cada página continua de onde a anterior parou,
+    # sem OFFSET, usando os índices de migrations/001_perguntas_indexes.sql
+    page_size = max(1, min(page_size, QUESTION_PAGE_MAX))
+    conditions, params = question_filters(loja, date_from, date_to)
+    order = question_order(order_by, loja)
+
+    values = decode_cursor(cursor) if cursor else None
+    if values is not None and len(values) == len(order):
+        condition, keyset_params = _keyset_condition(order, values)
+        conditions.append(condition)
+        params.extend(keyset_params)
+
+    query = f'SELECT {QUESTION_COLUMNS} FROM perguntas'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY ' + ', '.join(f'{column} {direction}' for column, direction in order)
+    query += ' LIMIT %s'
+    params.append(page_size + 1)
+
+    with get_connection() as connection, connection.cursor(dictionary=True) as db_cursor:
+        db_cursor.execute(query, params)
+        rows = db_cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([rows[-1][column] for column, _ in order])
+    return rows, next_cursor
+
+# Exportação do histórico (/perguntas/export): conexões próprias, fora do pool, para
+# que uma exportação longa não ocupe as conexões do webhook e das páginas
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', '2'))
+# Tempo que o MySQL espera o cliente ler as linhas; com cursor sem buffer o ritmo é o do download
+EXPORT_NET_WRITE_TIMEOUT = int(os.getenv('EXPORT_NET_WRITE_TIMEOUT', '600'))
+
+_export_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+def iter_questions(loja=None, date_from=None, date_to=None, chunk_size=EXPORT_CHUNK_SIZE):
+    # Gera blocos de até chunk_size linhas (dicionários) de um cursor sem buffer: o servidor
+    # envia as linhas conforme são lidas, então a memória não cresce com o tamanho do
+    # histórico. Ordenado pela chave primária, sem ordenação em memória no MySQL.
+    if not _export_slots.acquire(blocking=False):
+        raise mysql.connector.errors.PoolError(f"Já há {EXPORT_MAX_CONCURRENT} exportações em andamento")
+
+    conditions, params = question_filters(loja, date_from, date_to)
+    query = f'SELECT {QUESTION_COLUMNS} FROM perguntas'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY id'
+
+    connection = None
+    finished = False
+    exported = 0
+    start = time.monotonic()
+    try:
+        # Implementação em Python: ao desconectar, não lê o resto do resultado como a extensão C
+        connection = mysql.connector.connect(use_pure=True, **DB_CONFIG)
+        with connection.cursor() as session:
+            session.execute(f'SET SESSION net_write_timeout = {EXPORT_NET_WRITE_TIMEOUT}')
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            exported += len(rows)
+            yield rows
+        cursor.close()
+        finished = True
+    finally:
+        if connection is not None:
+            # Interrompida no meio (cliente desconectou), a conexão ainda tem linhas por
+            # ler; fechar o socket é mais rápido que consumir o resto do resultado
+            try:
+                connection.close() if finished else connection.disconnect()
+            except mysql.connector.Error as error:
+                logging.warning(f"Erro ao fechar conexão da exportação: {error}")
+        _export_slots.release()
+        logging.info(
+            f"Exportação de perguntas {'concluída' if finished else 'interrompida'}: "
+            f"{exported} linhas em {time.monotonic() - start:.1f}s"
+        )
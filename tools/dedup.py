@@ -0,0 +1,121 @@
+import threading
+import time
+import logging
+import sys
+from tools.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Tópicos em que o processamento busca todas as perguntas do vendedor, então
+# várias notificações pendentes do mesmo vendedor equivalem a uma só
+COALESCED_TOPICS = {'questions'}
+
+
+class NotificationCoalescer:
+    # Descarta reenvios de (user_id, resource, topic) dentro da janela e junta
+    # as notificações de perguntas de um vendedor que ainda não começaram a ser processadas.
+    # Com store (a fila SQLite), a janela fica no arquivo da fila e vale para todos os
+    # processos de ingestão (uvicorn --workers N); sem ele, só para este processo
+
+    def __init__(self, window=60, store=None):
+        self.window = window
+        self.store = store
+        self.duplicates = 0
+        self.coalesced = 0
+        self._seen = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def should_enqueue(self, body):
+        # Lado da ingestão: só a janela de repetição
+        key = (body.get('user_id'), body.get('resource'), body.get('topic'))
+        if self.store is not None:
+            if self.store.first_in_window(key, self.window):
+                return True
+            with self._lock:
+                self.duplicates += 1
+            return False
+
+        now = time.monotonic()
+
+        with self._lock:
+            self._prune(now)
+            seen_at = self._seen.get(key)
+            if seen_at is not None and now - seen_at < self.window:
+                self.duplicates += 1
+                return False
+            self._seen[key] = now
+            return True
+
+    def claim_pending(self, body):
+        # Lado do processamento: False se já há um job de perguntas do vendedor
+        # aguardando na fila dos workers, que vai buscar esta pergunta também
+        if body.get('topic') not in COALESCED_TOPICS:
+            return True
+        user_id = body.get('user_id')
+        with self._lock:
+            if user_id in self._pending:
+                self.coalesced += 1
+                return False
+            self._pending.add(user_id)
+            return True
+
+    def started(self, body):
+        # A partir daqui uma nova notificação precisa de um novo job, pois
+        # a busca de perguntas em andamento pode não enxergá-la
+        with self._lock:
+            self._pending.discard(body.get('user_id'))
+
+    def _prune(self, now):
+        if now - self._last_prune < self.window:
+            return
+        self._seen = {key: seen_at for key, seen_at in self._seen.items() if now - seen_at < self.window}
+        self._last_prune = now
+
+    def stats(self):
+        with self._lock:
+            return {
+                'duplicates': self.duplicates,
+                'coalesced': self.coalesced,
+                'pending_sellers': len(self._pending),
+            }
+
+
+class ProcessedQuestions:
+    # Registro persistente das perguntas já respondidas, para que reinícios e
+    # notificações repetidas não respondam a mesma pergunta duas vezes
+
+    def __init__(self, store=None, retention=7 * 86400, maxsize=10000):
+        self._done = TTLCache('processed_questions', maxsize=maxsize, ttl=retention, store=store)
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def claim(self, question_id):
+        with self._lock:
+            if question_id in self._in_flight or self._done.get(question_id) is not None:
+                return False
+            self._in_flight.add(question_id)
+            return True
+
+    def is_done(self, question_id):
+        return self._done.get(question_id) is not None
+
+    def complete(self, question_id):
+        self._done.set(question_id, True)
+        with self._lock:
+            self._in_flight.discard(question_id)
+
+    def release(self, question_id):
+        with self._lock:
+            self._in_flight.discard(question_id)
@@ -1,298 +1,520 @@
-import os
-import requests
-import pytz
-import json
-import logging
-import sys  
-from datetime import datetime, timedelta
-from dotenv import load_dotenv, set_key
-from tools.utils import prompts, intentions
-from tools.user_config import user_config
-
-load_dotenv()
-
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)  
-stderr_handler = logging.StreamHandler(sys.stderr)
-stderr_handler.setLevel(logging.INFO) 
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-stderr_handler.setFormatter(formatter)
-logger.addHandler(stderr_handler)
-
-if len(logger.handlers) > 1:
-    logger.handlers = [stderr_handler]
-
-def get_env_variable(key):
-    return os.getenv(key)
-
-def set_env_variable(key, value):
-    dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
-    set_key(dotenv_path, key, value)
-
-def get_access_token(user_id, auth_code):
-    if user_id not in user_config:
-        raise ValueError("Invalid user ID")
-
-    config = user_config[user_id]
-    url = 'https://api.mercadolibre.com/oauth/token'
-
-    headers = {
-        'accept': 'application/json',
-        'content-type': 'application/x-www-form-urlencoded',
-    }
-
-    data = {
-        'grant_type': 'authorization_code',
-        'client_id': os.getenv(config['app_id']),
-        'client_secret': os.getenv(config['secret_key']),
-        'code': auth_code,
-        'redirect_uri': os.getenv('REDIRECT_URI')
-    }
-
-    response = requests.post(url, headers=headers, data=data)
-
-    if response.status_code == 200:
-        return response.json()
-    else:
-        response.raise_for_status()
-
-
-def get_received_questions(user_id, access_token):
-    logger.info(f'Notificação recebida do usuário: {user_id}')
-
-    # Obter a data atual e o dia anterior em UTC
-    current_time = datetime.now(pytz.UTC)
-    previous_day = current_time - timedelta(days=1)
-    status = "UNANSWERED"
-
-    # Formatando as datas para strings ISO
-    current_time_str = current_time.isoformat()
-    previous_day_str = previous_day.isoformat()
-
-    url = f"https://api.mercadolibre.com/my/received_questions/search"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-
-    params = {
-        "status": status,
-        "date_created_from": previous_day_str,
-        "date_created_to": current_time_str
-    }
-
-    response = requests.get(url, headers=headers, params=params)
-
-    if response.status_code == 200:
-        data = response.json()
-        logger.info("Dados recebidos com sucesso da API Mercado Libre")
-        
-        extracted_data = []
-        for question in data['questions']:
-            question_id = question['id']
-            item_id = question['item_id']
-            client_id = question['from']['id']
-            text = question['text']
-            
-            client_info = get_client_info(client_id, access_token)
-            item_description = get_item_description(item_id, access_token)
-            item_details = get_item_details(item_id, access_token)
-
-            extracted_data.append({
-                "client_id": client_id,
-                "text": text,
-                "item_id": item_id,
-                "question_id": question_id,
-                "client_info": client_info,
-                "item_description": item_description,
-                "item_details": item_details,
-            })
-        
-        #Converter os dados extraídos para JSON
-        extracted_data_json = json.dumps(extracted_data, ensure_ascii=False, indent=4)
-        logger.info(f"Dados extraídos: {extracted_data_json}")
-        return response  # Retornar a resposta original do request
-
-    else:
-        logger.error(f"Request falhou com o código de status: {response.status_code}")
-        logger.error(f"URL: {url}")
-        logger.error(f"Headers: {headers}")
-        logger.error(f"Params: {params}")
-        logger.error(f"Response Content: {response.content}")
-        return response  
-    
-def get_client_info(client_id, access_token):
-    url = f"https://api.mercadolibre.com/users/{client_id}"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        logger.info(f"Informações do cliente {client_id} obtidas com sucesso")
-        return response.json()
-    else:
-        logger.error(f"Erro ao obter informações do cliente {client_id}: {response.status_code}")
-        return {}
-
-def get_item_description(item_id, access_token):
-    url = f"https://api.mercadolibre.com/items/{item_id}/description"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        description = response.json().get('plain_text', '')
-        logger.info(f"Descrição do item {item_id} obtida com sucesso")
-        return description
-    else:
-        logger.error(f"Erro ao obter descrição do item {item_id}: {response.status_code}")
-        return ""
-
-def get_item_details(item_id, access_token):
-    url = f"https://api.mercadolibre.com/items/{item_id}"
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        item_data = response.json()
-        logger.info(f"Detalhes do item {item_id} obtidos com sucesso")
-        # Selecionar apenas os campos de interesse
-        selected_data = {
-            "item_title": item_data.get("title"),
-            "category_id": item_data.get("category_id"),
-            "available_quantity": item_data.get("available_quantity"),
-            "warranty_time": next((term.get("value_name") for term in item_data.get("sale_terms", []) if term.get("id") == "WARRANTY_TIME"), None),
-            "item_condition": item_data.get("condition"),
-            "pictures": [picture.get("url") for picture in item_data.get("pictures", [])],
-            "attributes": [
-                {
-                    "name": attribute.get("name"),
-                    "value": attribute.get("value_name", "No value")
-                } for attribute in item_data.get("attributes", []) if attribute.get("id") in [
-                    "MATERIAL", "UNITS_PER_PACK", "BASE_MATERIAL", "BRAND", "DIAMETER", "FINISH", "HEIGHT", "IS_EXTENSIBLE", "IS_KIT", 
-                    "IS_SUITABLE_FOR_EXTERIOR", "LENGTH", "REQUIRES_ASSEMBLY", "STYLE", "TOP_MATERIAL", "WEIGHT", "WIDTH"]
-            ]
-        }
-        return selected_data
-    else:
-        logger.error(f"Erro ao obter detalhes do item {item_id}: {response.status_code}")
-        return {}
-
-def post_to_meli(resource, resposta_gpt, access_token):
-    try:
-        if not access_token:
-            raise ValueError("ACCESS_TOKEN não definido ou expirado")
-
-        url = "https://api.mercadolibre.com/answers"
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json'
-        }
-        data = {
-            "question_id": resource,
-            "text": resposta_gpt
-        }
-
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        logger.info(f"Resposta postada com sucesso para a pergunta {resource}")
-        return response.json()
-
-    except ValueError as ve:
-        logger.error(f"ValueError: {ve}")
-        raise
-
-    except requests.exceptions.HTTPError as http_err:
-        logger.error(f"HTTP error occurred: {http_err}")
-        logger.error(f"Response status code: {response.status_code}")
-        logger.error(f"Response content: {response.content}")
-        raise
-
-    except requests.exceptions.RequestException as req_err:
-        logger.error(f"Request error occurred: {req_err}")
-        raise
-
-    except Exception as e:
-        logger.error(f"An error occurred: {e}")
-        raise
-
-def classify_by_chatgpt(response):
-    pergunta = response.get('text')
-    logger.info(pergunta)
-    api_key = os.getenv('OPENAI_API_KEY')
-    headers = {
-        'Authorization': f'Bearer {api_key}',
-        'Content-Type': 'application/json'
-    }
-    data = {
-        "model": "gpt-4o",
-        "messages": [
-            {
-                "role": "system",
-                "content": f'de acordo com as palavras chaves {intentions}, classifique o tipo desta pergunta: "{response}", se não conseguir identificar, responda: "Não Identificado"'
-            }
-        ],
-        "max_tokens": 50,
-        "temperature": 0.5
-    }
-
-    logger.info(f"Enviando solicitação para classificação com GPT-4... {data}")
-    try:
-        response = requests.post('https://api.openai.com/v1/chat/completions', headers=headers, json=data)
-        response.raise_for_status() 
-        result = response.json()
-        classification = result['choices'][0]['message']['content'].strip()
-        logger.info(f"Classificação recebida: {classification}")
-        return classification
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Erro ao classificar com GPT-4: {e}")
-        raise
-
-def answer_by_chatgpt(response, classification):
-    pergunta = response.get('text')
-    client_info = response.get('client_info')
-    descricao = response.get('item_description')
-    produto = response.get('item_title')
-    atributos = response.get('attributes')
-
-    print(pergunta, atributos, client_info, descricao, produto)
-
-    api_key = os.getenv('OPENAI_API_KEY')
-    headers = {
-        'Authorization': f'Bearer {api_key}',
-        'Content-Type': 'application/json'
-    }
-    data = {
-        "model": "gpt-4o",
-        "temperature": 1,
-        "messages": [
-            {
-                "role": "system",
-                "content": f'Você é uma assistente especializada em responder perguntas sobre os produtos de nossa loja de Móveis Decorativos no Mercado Livre. Aqui está a pergunta, nome do usuário, descrição do produto e demais informações, responda a pergunta de acordo com as informações disponíveis: Tipo de pergunta: {classification} Informações gerais {response}, prompts caso não haja a informação:"{prompts}"'
-            }
-        ],
-        "max_tokens": 256
-    }
-
-    logger.info(f"Enviando solicitação para responder com GPT-4... {data}")
-    try:
-        response = requests.post('https://api.openai.com/v1/chat/completions', headers=headers, json=data)
-        response.raise_for_status()  
-        result = response.json()
-        answer = result['choices'][0]['message']['content'].strip()
-        usage = result.get('usage', {})
-        input_tokens = usage.get('prompt_tokens', 0)
-        output_tokens = usage.get('completion_tokens', 0)
-        total_tokens = usage.get('total_tokens', input_tokens + output_tokens)
-
-        logger.info(f"Pergunta do cliente: {response}")
-        logger.info(f"Resposta do GPT: {answer}")
-        logger.info(f"Tokens de entrada: {input_tokens}")
-        logger.info(f"Tokens de saída: {output_tokens}")
-        logger.info(f"Total de tokens usados: {total_tokens}")
-        
-        return answer
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Erro ao responder com GPT-4: {e}")
-        raise
-
+import os
+import requests
+from tools import http_client
+from tools.rate_limiter import rate_limiter, OPENAI_CREDENTIAL, PRIORITY_QUESTIONS
+from tools.metrics import openai_tokens
+import pytz
+import json
+import logging
+import sys  
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from dotenv import load_dotenv, set_key
+from tools.utils import intentions
+from tools.user_config import user_config
+from tools.cache import TTLCache, SQLiteCacheStore
+from tools.prompt import compact_context, relevant_prompts, log_prompt_size
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)  
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO) 
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Limite de chamadas simultâneas de enriquecimento, timeout (segundos) de cada
+# chamada e prazo máximo para enriquecer todas as perguntas de uma notificação
+ENRICHMENT_MAX_WORKERS = int(os.getenv('ENRICHMENT_MAX_WORKERS', '8'))
+ENRICHMENT_TIMEOUT = float(os.getenv('ENRICHMENT_TIMEOUT', '10'))
+ENRICHMENT_DEADLINE = float(os.getenv('ENRICHMENT_DEADLINE', '30'))
+
+# A API do Mercado Livre aceita até 20 ids por chamada de multiget
+MULTIGET_CHUNK_SIZE = 20
+# Campos dos itens usados por select_item_fields, para reduzir o payload do multiget
+ITEM_MULTIGET_ATTRIBUTES = 'id,title,category_id,available_quantity,sale_terms,condition,pictures,attributes'
+
+enrichment_executor = ThreadPoolExecutor(max_workers=ENRICHMENT_MAX_WORKERS, thread_name_prefix='enrichment')
+
+# Cache de itens e compradores; com CACHE_DB_PATH definido, persiste em SQLite local
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH')
+ITEM_CACHE_TTL = int(os.getenv('ITEM_CACHE_TTL', '3600'))
+CLIENT_CACHE_TTL = int(os.getenv('CLIENT_CACHE_TTL', '86400'))
+CACHE_MAXSIZE = int(os.getenv('CACHE_MAXSIZE', '2048'))
+
+cache_store = SQLiteCacheStore(CACHE_DB_PATH) if CACHE_DB_PATH else None
+item_details_cache = TTLCache('item_details', maxsize=CACHE_MAXSIZE, ttl=ITEM_CACHE_TTL, store=cache_store)
+item_description_cache = TTLCache('item_description', maxsize=CACHE_MAXSIZE, ttl=ITEM_CACHE_TTL, store=cache_store)
+client_info_cache = TTLCache('client_info', maxsize=CACHE_MAXSIZE, ttl=CLIENT_CACHE_TTL, store=cache_store)
+
+def get_env_variable(key):
+    return os.getenv(key)
+
+def set_env_variable(key, value):
+    dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
+    set_key(dotenv_path, key, value)
+
+def get_access_token(user_id, auth_code):
+    if user_id not in user_config:
+        raise ValueError("Invalid user ID")
+
+    config = user_config[user_id]
+    url = 'https://api.mercadolibre.com/oauth/token'
+
+    headers = {
+        'accept': 'application/json',
+        'content-type': 'application/x-www-form-urlencoded',
+    }
+
+    data = {
+        'grant_type': 'authorization_code',
+        'client_id': os.getenv(config['app_id']),
+        'client_secret': os.getenv(config['secret_key']),
+        'code': auth_code,
+        'redirect_uri': os.getenv('REDIRECT_URI')
+    }
+
+    response = http_client.post(url, headers=headers, data=data)
+
+    if response.status_code == 200:
+        return response.json()
+    else:
+        response.raise_for_status()
+
+
+def received_questions_params():
+    # Perguntas sem resposta das últimas 24 horas (UTC)
+    current_time = datetime.now(pytz.UTC)
+    previous_day = current_time - timedelta(days=1)
+    return {
+        "status": "UNANSWERED",
+        "date_created_from": previous_day.isoformat(),
+        "date_created_to": current_time.isoformat()
+    }
+
+def log_received_questions(response, url, headers, params):
+    if response.status_code == 200:
+        data = response.json()
+        logger.info("Dados recebidos com sucesso da API Mercado Libre")
+        logger.info(f"{len(data['questions'])} perguntas sem resposta encontradas")
+    else:
+        logger.error(f"Request falhou com o código de status: {response.status_code}")
+        logger.error(f"URL: {url}")
+        logger.error(f"Headers: {headers}")
+        logger.error(f"Params: {params}")
+        logger.error(f"Response Content: {response.content}")
+
+def get_received_questions(user_id, access_token):
+    logger.info(f'Notificação recebida do usuário: {user_id}')
+
+    url = f"https://api.mercadolibre.com/my/received_questions/search"
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    params = received_questions_params()
+
+    response = http_client.get(url, headers=headers, params=params, priority=PRIORITY_QUESTIONS)
+    log_received_questions(response, url, headers, params)
+    return response  # Retornar a resposta original do request
+
+def enrich_questions(questions, access_token):
+    # Busca clientes e itens em lotes (multiget) e as descrições de cada item
+    # distinto em paralelo, limitadas pelo pool de enriquecimento
+    item_ids = list(dict.fromkeys(question['item_id'] for question in questions))
+    client_ids = list(dict.fromkeys(question['from']['id'] for question in questions))
+
+    items_details, items_futures = _submit_multiget('items', item_ids, access_token, item_details_cache, select_item_fields)
+    clients_info, clients_futures = _submit_multiget('users', client_ids, access_token, client_info_cache, None)
+    description_futures = {
+        item_id: enrichment_executor.submit(get_item_description, item_id, access_token)
+        for item_id in item_ids
+    }
+
+    deadline = time.monotonic() + ENRICHMENT_DEADLINE
+    _collect_multiget(items_details, items_futures, deadline)
+    _collect_multiget(clients_info, clients_futures, deadline)
+    items_descriptions = {
+        item_id: _enrichment_result(future, "", deadline)
+        for item_id, future in description_futures.items()
+    }
+
+    extracted_data = []
+    for question in questions:
+        item_id = question['item_id']
+        client_id = question['from']['id']
+        extracted_data.append({
+            "client_id": client_id,
+            "text": question['text'],
+            "item_id": item_id,
+            "question_id": question['id'],
+            "seller_id": question.get('seller_id'),
+            "date_created": question.get('date_created'),
+            "client_info": clients_info.get(client_id, {}),
+            "item_description": items_descriptions.get(item_id, ""),
+            "item_details": items_details.get(item_id, {}),
+        })
+    return extracted_data
+
+def get_items_details(item_ids, access_token):
+    results, futures = _submit_multiget('items', item_ids, access_token, item_details_cache, select_item_fields)
+    return _collect_multiget(results, futures, time.monotonic() + ENRICHMENT_DEADLINE)
+
+def get_clients_info(client_ids, access_token):
+    results, futures = _submit_multiget('users', client_ids, access_token, client_info_cache, None)
+    return _collect_multiget(results, futures, time.monotonic() + ENRICHMENT_DEADLINE)
+
+def _submit_multiget(resource, ids, access_token, cache, project):
+    # Ids repetidos são buscados uma vez só; os que já estão em cache não geram requisição
+    results = {}
+    missing = []
+    for resource_id in dict.fromkeys(ids):
+        cached = cache.get(resource_id)
+        if cached is not None:
+            results[resource_id] = cached
+        else:
+            missing.append(resource_id)
+
+    futures = [
+        enrichment_executor.submit(_fetch_multiget_chunk, resource, missing[i:i + MULTIGET_CHUNK_SIZE], access_token, cache, project)
+        for i in range(0, len(missing), MULTIGET_CHUNK_SIZE)
+    ]
+    return results, futures
+
+def _collect_multiget(results, futures, deadline):
+    for future in futures:
+        results.update(_enrichment_result(future, {}, deadline))
+    return results
+
+def multiget_params(resource, ids):
+    params = {
+        "ids": ",".join(str(resource_id) for resource_id in ids)
+    }
+    if resource == 'items':
+        params["attributes"] = ITEM_MULTIGET_ATTRIBUTES
+    return params
+
+def store_multiget_results(resource, ids, entries, cache, project):
+    results = {}
+    for entry in entries:
+        body = entry.get('body') or {}
+        if entry.get('code') != 200 or 'id' not in body:
+            logger.error(f"Erro no multiget de {resource}: {entry}")
+            continue
+        data = project(body) if project else body
+        # O multiget devolve o id como o próprio recurso (str para itens, int para usuários)
+        resource_id = body['id']
+        cache.set(resource_id, data)
+        results[resource_id] = data
+    logger.info(f"Multiget de {resource}: {len(results)}/{len(ids)} obtidos com sucesso")
+    return results
+
+def _fetch_multiget_chunk(resource, ids, access_token, cache, project):
+    url = f"https://api.mercadolibre.com/{resource}"
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    response = http_client.hedged_get(url, headers=headers, params=multiget_params(resource, ids), timeout=ENRICHMENT_TIMEOUT)
+    if response.status_code != 200:
+        logger.error(f"Erro no multiget de {resource} ({len(ids)} ids): {response.status_code}")
+        return {}
+    return store_multiget_results(resource, ids, response.json(), cache, project)
+
+def _enrichment_result(future, default, deadline):
+    try:
+        return future.result(timeout=max(0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        logger.error(f"Prazo de {ENRICHMENT_DEADLINE}s esgotado ao enriquecer pergunta")
+        future.cancel()
+        return default
+    except Exception as e:
+        logger.error(f"Erro ao enriquecer pergunta: {e}")
+        return default
+
+def invalidate_item(item_id):
+    # Chamado quando o Mercado Livre notifica alteração no anúncio
+    item_details_cache.invalidate(item_id)
+    item_description_cache.invalidate(item_id)
+
+def get_cache_stats():
+    return [cache.stats() for cache in (item_details_cache, item_description_cache, client_info_cache)]
+
+def get_client_info(client_id, access_token):
+    cached = client_info_cache.get(client_id)
+    if cached is not None:
+        return cached
+
+    url = f"https://api.mercadolibre.com/users/{client_id}"
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    response = http_client.hedged_get(url, headers=headers, timeout=ENRICHMENT_TIMEOUT)
+    if response.status_code == 200:
+        logger.info(f"Informações do cliente {client_id} obtidas com sucesso")
+        client_info = response.json()
+        client_info_cache.set(client_id, client_info)
+        return client_info
+    else:
+        logger.error(f"Erro ao obter informações do cliente {client_id}: {response.status_code}")
+        return {}
+
+def get_item_description(item_id, access_token):
+    cached = item_description_cache.get(item_id)
+    if cached is not None:
+        return cached
+
+    url = f"https://api.mercadolibre.com/items/{item_id}/description"
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    response = http_client.hedged_get(url, headers=headers, timeout=ENRICHMENT_TIMEOUT)
+    if response.status_code == 200:
+        description = response.json().get('plain_text', '')
+        logger.info(f"Descrição do item {item_id} obtida com sucesso")
+        item_description_cache.set(item_id, description)
+        return description
+    else:
+        logger.error(f"Erro ao obter descrição do item {item_id}: {response.status_code}")
+        return ""
+
+def get_item_details(item_id, access_token):
+    cached = item_details_cache.get(item_id)
+    if cached is not None:
+        return cached
+
+    url = f"https://api.mercadolibre.com/items/{item_id}"
+    headers = {
+        "Authorization": f"Bearer {access_token}"
+    }
+    response = http_client.hedged_get(url, headers=headers, timeout=ENRICHMENT_TIMEOUT)
+    if response.status_code == 200:
+        item_data = response.json()
+        logger.info(f"Detalhes do item {item_id} obtidos com sucesso")
+        selected_data = select_item_fields(item_data)
+        item_details_cache.set(item_id, selected_data)
+        return selected_data
+    else:
+        logger.error(f"Erro ao obter detalhes do item {item_id}: {response.status_code}")
+        return {}
+
+def select_item_fields(item_data):
+    # Selecionar apenas os campos de interesse
+    return {
+        "item_title": item_data.get("title"),
+        "category_id": item_data.get("category_id"),
+        "available_quantity": item_data.get("available_quantity"),
+        "warranty_time": next((term.get("value_name") for term in item_data.get("sale_terms", []) if term.get("id") == "WARRANTY_TIME"), None),
+        "item_condition": item_data.get("condition"),
+        "pictures": [picture.get("url") for picture in item_data.get("pictures", [])],
+        "attributes": [
+            {
+                "name": attribute.get("name"),
+                "value": attribute.get("value_name", "No value")
+            } for attribute in item_data.get("attributes", []) if attribute.get("id") in [
+                "MATERIAL", "UNITS_PER_PACK", "BASE_MATERIAL", "BRAND", "DIAMETER", "FINISH", "HEIGHT", "IS_EXTENSIBLE", "IS_KIT", 
+                "IS_SUITABLE_FOR_EXTERIOR", "LENGTH", "REQUIRES_ASSEMBLY", "STYLE", "TOP_MATERIAL", "WEIGHT", "WIDTH"]
+        ]
+    }
+
+def post_to_meli(resource, resposta_gpt, access_token):
+    try:
+        if not access_token:
+            raise ValueError("ACCESS_TOKEN não definido ou expirado")
+
+        url = "https://api.mercadolibre.com/answers"
+        headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json'
+        }
+        data = {
+            "question_id": resource,
+            "text": resposta_gpt
+        }
+
+        response = http_client.post(url, headers=headers, json=data)
+        response.raise_for_status()
+        logger.info(f"Resposta postada com sucesso para a pergunta {resource}")
+        return response.json()
+
+    except ValueError as ve:
+        logger.error(f"ValueError: {ve}")
+        raise
+
+    except requests.exceptions.HTTPError as http_err:
+        logger.error(f"HTTP error occurred: {http_err}")
+        logger.error(f"Response status code: {response.status_code}")
+        logger.error(f"Response content: {response.content}")
+        raise
+
+    except requests.exceptions.RequestException as req_err:
+        logger.error(f"Request error occurred: {req_err}")
+        raise
+
+    except Exception as e:
+        logger.error(f"An error occurred: {e}")
+        raise
+
+OPENAI_CHAT_URL = 'https://api.openai.com/v1/chat/completions'
+
+def openai_headers():
+    api_key = os.getenv('OPENAI_API_KEY')
+    return {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+
+# Montagem das requisições e leitura das respostas do GPT, compartilhadas pelas
+# versões síncronas abaixo e pelas assíncronas de tools/async_functions.py
+
+def record_openai_usage(result, seller_id=None):
+    # Consumo real da chamada, descontado do limite de tokens por minuto da chave
+    # e somado ao consumo do vendedor em /metrics
+    usage = result.get('usage', {})
+    prompt_tokens = usage.get('prompt_tokens', 0)
+    completion_tokens = usage.get('completion_tokens', 0)
+    total_tokens = usage.get('total_tokens', prompt_tokens + completion_tokens)
+    rate_limiter.record_tokens(('openai', OPENAI_CREDENTIAL), total_tokens)
+    seller = str(seller_id) if seller_id is not None else 'desconhecido'
+    openai_tokens.inc(prompt_tokens, seller, 'prompt')
+    openai_tokens.inc(completion_tokens, seller, 'completion')
+
+def classification_request(response):
+    pergunta = response.get('text')
+    logger.info(pergunta)
+    data = {
+        "model": "gpt-4o",
+        "messages": [
+            {
+                "role": "system",
+                "content": f'de acordo com as palavras chaves {intentions}, classifique o tipo desta pergunta: "{pergunta}", se não conseguir identificar, responda: "Não Identificado"'
+            }
+        ],
+        "max_tokens": 50,
+        "temperature": 0.5
+    }
+
+    log_prompt_size('classificação', data['messages'][0]['content'])
+    logger.debug(f"Enviando solicitação para classificação com GPT-4... {data}")
+    return data
+
+def parse_classification(result, seller_id=None):
+    record_openai_usage(result, seller_id)
+    classification = result['choices'][0]['message']['content'].strip()
+    logger.info(f"Classificação recebida: {classification}")
+    return classification
+
+def answer_request(response, classification):
+    contexto = compact_context(response)
+    instrucoes = relevant_prompts(classification)
+    data = {
+        "model": "gpt-4o",
+        "temperature": 1,
+        "messages": [
+            {
+                "role": "system",
+                "content": f'Você é uma assistente especializada em responder perguntas sobre os produtos de nossa loja de Móveis Decorativos no Mercado Livre. Aqui está a pergunta, nome do usuário, descrição do produto e demais informações, responda a pergunta de acordo com as informações disponíveis: Tipo de pergunta: {classification} Informações gerais:\n{contexto}\nprompts caso não haja a informação:"{instrucoes}"'
+            }
+        ],
+        "max_tokens": 256
+    }
+
+    log_prompt_size('resposta', data['messages'][0]['content'])
+    logger.debug(f"Enviando solicitação para responder com GPT-4... {data}")
+    return data
+
+def parse_answer(result, seller_id=None):
+    answer = result['choices'][0]['message']['content'].strip()
+    usage = result.get('usage', {})
+    input_tokens = usage.get('prompt_tokens', 0)
+    output_tokens = usage.get('completion_tokens', 0)
+    total_tokens = usage.get('total_tokens', input_tokens + output_tokens)
+    record_openai_usage(result, seller_id)
+
+    logger.info(f"Resposta do GPT: {answer}")
+    logger.info(f"Tokens de entrada: {input_tokens}")
+    logger.info(f"Tokens de saída: {output_tokens}")
+    logger.info(f"Total de tokens usados: {total_tokens}")
+    return answer
+
+def classify_and_answer_request(response):
+    # Classificação e resposta numa única chamada, com saída JSON {"category", "answer"}
+    contexto = compact_context(response)
+    instrucoes = relevant_prompts(None)
+    data = {
+        "model": "gpt-4o",
+        "temperature": 1,
+        "response_format": {"type": "json_object"},
+        "messages": [
+            {
+                "role": "system",
+                "content": f'Você é uma assistente especializada em responder perguntas sobre os produtos de nossa loja de Móveis Decorativos no Mercado Livre. Primeiro classifique a pergunta de acordo com as palavras chaves {intentions} (se não conseguir identificar, use "Não Identificado"), depois responda a pergunta de acordo com as informações disponíveis: Informações gerais:\n{contexto}\nprompts caso não haja a informação:"{instrucoes}". Devolva apenas um JSON no formato {{"category": "<tipo da pergunta>", "answer": "<resposta ao cliente>"}}'
+            }
+        ],
+        "max_tokens": 300
+    }
+
+    log_prompt_size('classificação e resposta', data['messages'][0]['content'])
+    logger.debug(f"Enviando solicitação para classificar e responder com GPT-4... {data}")
+    return data
+
+def parse_classify_and_answer(result, seller_id=None):
+    content = result['choices'][0]['message']['content'].strip()
+    usage = result.get('usage', {})
+    input_tokens = usage.get('prompt_tokens', 0)
+    output_tokens = usage.get('completion_tokens', 0)
+    record_openai_usage(result, seller_id)
+
+    try:
+        parsed = json.loads(content)
+        classification = str(parsed.get('category') or 'Não Identificado').strip()
+        answer = str(parsed.get('answer') or '').strip()
+    except (ValueError, AttributeError):
+        logger.warning(f"Resposta do GPT fora do formato JSON esperado: {content}")
+        classification, answer = 'Não Identificado', content
+
+    if not answer:
+        raise ValueError("GPT não retornou resposta para a pergunta")
+
+    logger.info(f"Classificação recebida: {classification}")
+    logger.info(f"Resposta do GPT: {answer}")
+    logger.info(f"Tokens de entrada: {input_tokens}")
+    logger.info(f"Tokens de saída: {output_tokens}")
+    return classification, answer
+
+def classify_by_chatgpt(response):
+    data = classification_request(response)
+    seller_id = response.get('seller_id')
+    try:
+        response = http_client.post(OPENAI_CHAT_URL, headers=openai_headers(), json=data)
+        response.raise_for_status() 
+        return parse_classification(response.json(), seller_id)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Erro ao classificar com GPT-4: {e}")
+        raise
+
+def answer_by_chatgpt(response, classification):
+    data = answer_request(response, classification)
+    seller_id = response.get('seller_id')
+    try:
+        response = http_client.post(OPENAI_CHAT_URL, headers=openai_headers(), json=data)
+        response.raise_for_status()  
+        return parse_answer(response.json(), seller_id)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Erro ao responder com GPT-4: {e}")
+        raise
+
+def classify_and_answer_by_chatgpt(response):
+    data = classify_and_answer_request(response)
+    seller_id = response.get('seller_id')
+    try:
+        response = http_client.post(OPENAI_CHAT_URL, headers=openai_headers(), json=data)
+        response.raise_for_status()
+        return parse_classify_and_answer(response.json(), seller_id)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Erro ao classificar e responder com GPT-4: {e}")
+        raise
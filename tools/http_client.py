@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+from tools.circuit_breaker import circuit_breakers, is_failure
+from tools.rate_limiter import (
+    rate_limiter, RATE_LIMITED_HOSTS, RATE_LIMIT_RETRIES, PRIORITY_POST, PRIORITY_QUESTIONS, PRIORITY_ENRICHMENT
+)
+import logging
+import sys
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Conexões mantidas abertas por host, tentativas em 429/5xx e timeouts (segundos)
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '3'))
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Hosts em que repetir um POST não tem efeito colateral (gerar a resposta de novo).
+# Em api.mercadolibre.com um POST repetido poderia responder a pergunta duas vezes.
+IDEMPOTENT_POST_HOSTS = {'api.openai.com'}
+
+# GETs idempotentes com cópia (hedged_get): segundos de espera antes da segunda
+# tentativa; 0 desliga. Convém algo próximo da latência p95 do endpoint.
+HTTP_HEDGE_DELAY = float(os.getenv('HTTP_HEDGE_DELAY', '0'))
+HTTP_HEDGE_WORKERS = int(os.getenv('HTTP_HEDGE_WORKERS', '16'))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+hedge_executor = ThreadPoolExecutor(max_workers=HTTP_HEDGE_WORKERS, thread_name_prefix='http-hedge') if HTTP_HEDGE_DELAY else None
+_hedge_stats = {'hedged': 0, 'hedge_won': 0}
+_hedge_stats_lock = threading.Lock()
+
+
+def _build_session(host):
+    allowed_methods = set(Retry.DEFAULT_ALLOWED_METHODS)
+    if host in IDEMPOTENT_POST_HOSTS:
+        allowed_methods.add('POST')
+    # Nos hosts com cota o 429 fica com o rate_limiter (request), que pausa a credencial
+    # inteira; repetir aqui também multiplicaria as tentativas e esconderia o 429 dele
+    status_forcelist = RETRY_STATUS_CODES
+    if host in RATE_LIMITED_HOSTS:
+        status_forcelist = tuple(code for code in RETRY_STATUS_CODES if code != 429)
+
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=status_forcelist,
+        allowed_methods=frozenset(allowed_methods),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Connection': 'keep-alive'})
+    logger.info(f"Sessão HTTP criada para {host} (pool de {HTTP_POOL_SIZE} conexões)")
+    return session
+
+
+def get_session(url):
+    host = urlparse(url).netloc
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = _sessions[host] = _build_session(host)
+    return session
+
+
+def request(method, url, priority=None, **kwargs):
+    # Mercado Livre e OpenAI passam pelo rate_limiter: a requisição espera a vez na
+    # cota da credencial e, num 429, a credencial inteira pausa pelo Retry-After e a
+    # requisição é repetida (um 429 não foi processado, então repetir o POST é seguro)
+    kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    limit_key = rate_limiter.key_for(url, kwargs.get('headers'))
+    if priority is None:
+        priority = default_priority(method, limit_key)
+
+    breaker = circuit_breakers.for_url(url)
+
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.allow()
+        if limit_key:
+            try:
+                rate_limiter.acquire(limit_key, priority)
+            except BaseException:
+                # A chamada não chegou a sair: libera a vaga de sondagem do disjuntor
+                if breaker is not None:
+                    breaker.cancelled()
+                raise
+        response = _send(breaker, method, url, kwargs)
+        if not (limit_key and response.status_code == 429):
+            return response
+        rate_limiter.throttled(limit_key, response.headers.get('Retry-After'))
+        if attempt >= RATE_LIMIT_RETRIES:
+            return response
+        attempt += 1
+
+
+def _send(breaker, method, url, kwargs):
+    # Erros de conexão, timeouts, 5xx e chamadas lentas contam como falha do endpoint
+    if breaker is None:
+        return get_session(url).request(method, url, **kwargs)
+    start = time.monotonic()
+    try:
+        response = get_session(url).request(method, url, **kwargs)
+    except Exception:
+        breaker.record(time.monotonic() - start, failed=True)
+        raise
+    breaker.record(time.monotonic() - start, failed=is_failure(response.status_code))
+    return response
+
+
+def default_priority(method, limit_key):
+    if limit_key and limit_key[0] == 'openai':
+        return PRIORITY_QUESTIONS
+    return PRIORITY_POST if method == 'POST' else PRIORITY_ENRICHMENT
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def hedged_get(url, **kwargs):
+    # Só para GETs idempotentes: se a primeira tentativa não responder em
+    # HTTP_HEDGE_DELAY segundos, dispara uma segunda e usa a que terminar antes.
+    # A perdedora não pode ser cancelada no requests e termina em segundo plano.
+    if not HTTP_HEDGE_DELAY:
+        return get(url, **kwargs)
+    first = hedge_executor.submit(get, url, **kwargs)
+    try:
+        return first.result(timeout=HTTP_HEDGE_DELAY)
+    except FutureTimeoutError:
+        pass
+
+    second = hedge_executor.submit(get, url, **kwargs)
+    _hedge_count('hedged')
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    _hedge_count('hedge_won')
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def _hedge_count(name):
+    with _hedge_stats_lock:
+        _hedge_stats[name] += 1
+
+
+def hedge_stats():
+    with _hedge_stats_lock:
+        return dict(_hedge_stats, delay=HTTP_HEDGE_DELAY)
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
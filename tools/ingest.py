@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from tools.dedup import NotificationCoalescer
+from tools.persistent_queue import MemoryQueue, SQLiteQueue
+import logging
+import sys
+
+# Lado de entrada das notificações, compartilhado pela rota Flask e pelo servidor
+# ASGI (asgi.py). Não importa nada do processamento (banco, OpenAI), para que os
+# processos de ingestão subam rápido e só escrevam na fila.
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+load_dotenv()
+
+# Fila de entrada: 'sqlite' (persistente, padrão, compartilhável entre processos) ou 'memory'
+NOTIFICATION_QUEUE_BACKEND = os.getenv('NOTIFICATION_QUEUE_BACKEND', 'sqlite')
+NOTIFICATION_QUEUE_PATH = os.getenv('NOTIFICATION_QUEUE_PATH', 'notification_queue.db')
+NOTIFICATION_VISIBILITY_TIMEOUT = float(os.getenv('NOTIFICATION_VISIBILITY_TIMEOUT', '300'))
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', '5'))
+# Janela (segundos) para descartar notificações repetidas
+NOTIFICATION_DEDUP_WINDOW = float(os.getenv('NOTIFICATION_DEDUP_WINDOW', '60'))
+# Acima deste tamanho a fila recusa notificações com 503 (0 = sem limite)
+NOTIFICATION_QUEUE_MAXSIZE = int(os.getenv('NOTIFICATION_QUEUE_MAXSIZE', '0'))
+# O tamanho da fila é reconsultado no máximo a cada QUEUE_SIZE_REFRESH segundos
+QUEUE_SIZE_REFRESH = float(os.getenv('QUEUE_SIZE_REFRESH', '0.2'))
+RETRY_AFTER_SECONDS = 5
+
+QUEUED = 'queued'
+DUPLICATE = 'duplicate'
+FULL = 'full'
+
+if NOTIFICATION_QUEUE_BACKEND == 'sqlite':
+    notification_queue = SQLiteQueue(
+        NOTIFICATION_QUEUE_PATH,
+        visibility_timeout=NOTIFICATION_VISIBILITY_TIMEOUT,
+        max_attempts=NOTIFICATION_MAX_ATTEMPTS
+    )
+else:
+    notification_queue = MemoryQueue()
+
+# A janela de repetição fica no arquivo da fila SQLite, compartilhada entre os processos de ingestão
+notification_coalescer = NotificationCoalescer(
+    window=NOTIFICATION_DEDUP_WINDOW,
+    store=notification_queue if notification_queue.durable else None
+)
+
+_size_lock = threading.Lock()
+_size = {'value': 0, 'checked_at': 0.0}
+
+
+def approximate_qsize():
+    # COUNT(*) a cada requisição custaria O(n) no SQLite; um valor de até
+    # QUEUE_SIZE_REFRESH segundos atrás basta para o controle de backpressure
+    now = time.monotonic()
+    if now - _size['checked_at'] >= QUEUE_SIZE_REFRESH:
+        with _size_lock:
+            if now - _size['checked_at'] >= QUEUE_SIZE_REFRESH:
+                _size['value'] = notification_queue.qsize()
+                _size['checked_at'] = now
+    return _size['value']
+
+
+def enqueue_notification(body):
+    # A fila cheia é verificada antes do registro na janela de repetição, para que
+    # o reenvio do Mercado Livre depois do 503 não seja descartado como repetido
+    if NOTIFICATION_QUEUE_MAXSIZE and approximate_qsize() >= NOTIFICATION_QUEUE_MAXSIZE:
+        logger.warning(f"Fila cheia ({NOTIFICATION_QUEUE_MAXSIZE}), notificação recusada")
+        return FULL
+    if not notification_coalescer.should_enqueue(body):
+        return DUPLICATE
+    # queued_at mede a espera na fila (tools/metrics.queue_wait); o corpo original não é alterado
+    notification_queue.put(dict(body, queued_at=time.time()))
+    _size['value'] += 1
+    return QUEUED
+
+
+def ingest_response(status):
+    # (corpo, código HTTP, cabeçalhos extras) da resposta ao Mercado Livre
+    if status == QUEUED:
+        return {"status": "success", "message": "Notificação recebida e enfileirada"}, 200, {}
+    if status == DUPLICATE:
+        return {"status": "ignored", "message": "Notificação repetida"}, 200, {}
+    return {"status": "error", "message": "Fila cheia, tente novamente"}, 503, {'Retry-After': str(RETRY_AFTER_SECONDS)}
@@ -0,0 +1,180 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Métricas em memória no formato texto do Prometheus (servidas em /metrics).
+# Cada observação é uma busca binária nas faixas e um incremento sob trava,
+# na casa de 1 µs; a formatação do texto só acontece quando /metrics é lido.
+
+# Faixas em segundos, de consultas rápidas ao banco até chamadas longas ao GPT
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 900, 3600)
+
+_metrics = []
+_collectors = []
+_caches = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _sort_key(entry):
+    # Rótulos podem misturar None, números e texto
+    return tuple(map(str, entry[0]))
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # Contagem por faixa (a última é +Inf), soma e total
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labelvalues):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(labelvalues, list(counts), total, count) for labelvalues, (counts, total, count) in self._series.items()]
+        for labelvalues, counts, total, count in sorted(series, key=_sort_key):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = _labels(self.labelnames, labelvalues, f'le="{_number(bound)}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_number(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, amount=1, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items(), key=_sort_key)
+        for labelvalues, value in values:
+            lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}')
+        return lines
+
+
+def _register(metric):
+    with _registry_lock:
+        _metrics.append(metric)
+
+
+def register_collector(collector):
+    # collector() devolve [(nome, tipo, ajuda, [(rótulos, valor), ...]), ...], lido a
+    # cada /metrics; serve para expor valores que já são mantidos em outro lugar
+    with _registry_lock:
+        _collectors.append(collector)
+    return collector
+
+
+def register_cache(cache):
+    # Chamado pelos caches de tools/cache.py; stats() é lido só quando /metrics é servido
+    with _registry_lock:
+        _caches.append(cache)
+
+
+def _cache_families():
+    hits, misses, sizes = [], [], []
+    for cache in list(_caches):
+        stats = cache.stats()
+        labels = {'cache': stats['name']}
+        hits.append((labels, stats['hits'] + stats.get('stale_hits', 0)))
+        misses.append((labels, stats['misses']))
+        sizes.append((labels, stats['size']))
+    return [
+        ('cache_hits_total', 'counter', 'Leituras encontradas no cache', hits),
+        ('cache_misses_total', 'counter', 'Leituras que não estavam no cache', misses),
+        ('cache_entries', 'gauge', 'Entradas em memória no cache', sizes),
+    ]
+
+
+def render():
+    lines = []
+    for metric in list(_metrics):
+        lines.extend(metric.render())
+    families = _cache_families() if _caches else []
+    for collector in list(_collectors):
+        families.extend(collector())
+    for name, kind, documentation, samples in families:
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# Métricas do processamento das notificações
+stage_duration = Histogram(
+    'pipeline_stage_duration_seconds',
+    'Duração de cada etapa do processamento de uma notificação',
+    ('stage',)
+)
+queue_wait = Histogram(
+    'notification_queue_wait_seconds',
+    'Tempo entre a notificação entrar na fila e um worker começar a processá-la',
+    buckets=QUEUE_WAIT_BUCKETS
+)
+openai_tokens = Counter(
+    'openai_tokens_total',
+    'Tokens consumidos na OpenAI por vendedor',
+    ('seller', 'kind')
+)
+db_pool_wait = Histogram(
+    'db_pool_wait_seconds',
+    'Espera por uma conexão livre no pool do MySQL'
+)
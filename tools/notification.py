@@ -1,11 +1,33 @@
-import queue
+import asyncio
+import atexit
+import os
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import traceback
 import json
 import requests
+from tools import http_client
 from dotenv import load_dotenv
-from tools.functions import get_received_questions, post_to_meli, classify_by_chatgpt, answer_by_chatgpt
-from tools.database import get_access_token, get_refresh_token, update_tokens, store_notification_data
+from tools.functions import get_received_questions, enrich_questions, post_to_meli, answer_by_chatgpt, classify_and_answer_by_chatgpt, invalidate_item, enrichment_executor
+from tools.classifier import classify_question, classify_locally, classifier_stats
+from tools.database import store_notification_data, wait_stored, get_answered_questions, notification_writer, DB_WRITE_BEHIND, pool_stats
+from tools.token_manager import token_manager
+from tools.worker_pool import KeyedWorkerPool
+from tools.cache import SQLiteCacheStore
+from tools.dedup import ProcessedQuestions
+from tools.ingest import notification_queue, notification_coalescer, enqueue_notification
+from tools.answer_cache import AnswerCache
+from tools.prompt import client_name
+from tools.stats import question_stats, STATS_ENABLED
+from tools import async_http, async_functions
+from tools.async_functions import off_loop
+from tools.circuit_breaker import circuit_breakers, CircuitOpenError, OPEN, HALF_OPEN
+from tools.rate_limiter import rate_limiter
+from tools.http_client import hedge_stats
+from tools import metrics
+from tools.metrics import stage_duration, queue_wait
+from tools.worker_stats import start_publisher
 import logging
 import sys 
 
@@ -23,95 +45,515 @@ if len(logger.handlers) > 1:
 
 load_dotenv()
 
-notification_queue = queue.Queue()
-lock = threading.Lock()
+NOTIFICATION_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', '4'))
+# No modo asyncio os workers só agendam as notificações no event loop; o limite de
+# notificações em andamento é este, e não o número de workers
+ASYNC_NOTIFICATION_CONCURRENCY = int(os.getenv('ASYNC_NOTIFICATION_CONCURRENCY', '64'))
+NOTIFICATION_SHUTDOWN_TIMEOUT = float(os.getenv('NOTIFICATION_SHUTDOWN_TIMEOUT', '30'))
+# Perguntas respondidas simultaneamente (classificação, resposta, post e gravação)
+ANSWER_MAX_WORKERS = int(os.getenv('ANSWER_MAX_WORKERS', '8'))
 
-def process_notifications():
-    while True:
-        notification = notification_queue.get()
-        if notification is None:
-            break
-        process_notification(notification)
-        notification_queue.task_done()
+answer_executor = ThreadPoolExecutor(max_workers=ANSWER_MAX_WORKERS, thread_name_prefix='answer')
+
+# 'threads': pipeline com requests e pools de threads; 'asyncio': mesmas etapas com
+# aiohttp num event loop compartilhado, com limites por etapa (tools/async_functions.py)
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'threads')
+
+# 'two_step': classificação e resposta em chamadas separadas ao GPT;
+# 'combined': uma única chamada devolvendo {category, answer}
+LLM_MODE = os.getenv('LLM_MODE', 'two_step')
+
+# Respostas já postadas reaproveitadas para perguntas iguais ou muito parecidas
+ANSWER_CACHE = os.getenv('ANSWER_CACHE', '1') == '1'
+ANSWER_CACHE_WARM_ROWS = int(os.getenv('ANSWER_CACHE_WARM_ROWS', '5000'))
+
+answer_cache = AnswerCache()
+
+def warm_answer_cache():
+    try:
+        answer_cache.load(get_answered_questions(ANSWER_CACHE_WARM_ROWS))
+    except Exception as e:
+        logger.error(f"Erro ao carregar o cache de respostas: {e}")
+
+if ANSWER_CACHE:
+    threading.Thread(target=warm_answer_cache, name='answer-cache-warmup', daemon=True).start()
+
+# Arquivo SQLite com as perguntas já respondidas
+PROCESSED_DB_PATH = os.getenv('PROCESSED_DB_PATH', 'processed_questions.db')
+PROCESSED_RETENTION = int(os.getenv('PROCESSED_RETENTION', str(7 * 86400)))
+
+processed_questions = ProcessedQuestions(store=SQLiteCacheStore(PROCESSED_DB_PATH), retention=PROCESSED_RETENTION)
+
+# A fila de entrada (tools/ingest.py) é compartilhada com o servidor de ingestão (asgi.py)
+NOTIFICATION_RETRY_DELAY = float(os.getenv('NOTIFICATION_RETRY_DELAY', '30'))
+# Espera máxima (segundos) entre tentativas do dispatcher após erros seguidos na fila
+DISPATCH_MAX_BACKOFF = float(os.getenv('DISPATCH_MAX_BACKOFF', '30'))
+
+# Resultado de uma pergunta ou notificação que falhou só porque o circuito de um
+# serviço estava aberto: volta para a fila sem gastar uma das tentativas
+CIRCUIT_OPEN = 'circuit_open'
+
+def notification_key(job):
+    # Notificações do mesmo vendedor são processadas em ordem, uma por vez
+    receipt, body = job
+    return body.get('user_id')
+
+def process_job(job):
+    # No modo asyncio devolve o Future da corrotina agendada: o worker fica livre e o
+    # pool só libera o vendedor quando ela terminar (tools/worker_pool.py)
+    receipt, body = job
+    if 'queued_at' in body:
+        queue_wait.observe(max(0.0, time.time() - body['queued_at']))
+    if PIPELINE_MODE == 'asyncio':
+        return async_http.submit(process_job_async(receipt, body))
+    finish_job(receipt, body, process_notification(body))
+
+async def process_job_async(receipt, body):
+    try:
+        processed = await process_notification_async(body)
+    except Exception as e:
+        logger.error(f"Erro não tratado na notificação {body}: {e}")
+        processed = False
+    # ack/nack tocam o SQLite da fila: fora do event loop
+    await off_loop(finish_job, receipt, body, processed)
+
+def finish_job(receipt, body, processed):
+    # Confirma a notificação só depois de processada; em caso de falha ela volta
+    # para a fila após NOTIFICATION_RETRY_DELAY segundos, ou quando o circuito
+    # aberto de um serviço voltar a aceitar chamadas, se isso demorar mais
+    if processed is True:
+        notification_queue.ack(receipt)
+    else:
+        delay = max(NOTIFICATION_RETRY_DELAY, circuit_breakers.open_remaining())
+        # queue_wait mede a espera desde que o item volta a ficar visível, não desde a primeira entrada;
+        # uma queda longa de um serviço não deve mandar as notificações para queue_dead
+        notification_queue.nack(receipt, dict(body, queued_at=time.time() + delay), delay=delay,
+                                count_attempt=processed != CIRCUIT_OPEN)
+
+# Etapas compartilhadas pelos dois pipelines; no modo asyncio as que tocam SQLite,
+# travas ou numpy rodam fora do event loop (off_loop)
+
+def handle_item_notification(body):
+    # Anúncio alterado: descarta os dados do item em cache e não há pergunta a responder
+    if body.get('topic') != 'items':
+        return False
+    item_id = str(body.get('resource', '')).rstrip('/').split('/')[-1]
+    if item_id:
+        invalidate_item(item_id)
+        answer_cache.invalidate_item(item_id)
+    return True
+
+def questions_from_response(user_id, response):
+    if response.status_code != 200:
+        raise Exception(f"Failed to fetch questions, status code: {response.status_code}")
+    questions = response.json()['questions']
+    if not questions:
+        # Comum quando as perguntas já foram respondidas por uma notificação anterior
+        logger.info(f"Nenhuma pergunta sem resposta para user_id {user_id}")
+    return questions
+
+def notification_result(user_id, results):
+    answered = sum(1 for result in results if result is True)
+    logger.info(f"Notificação processada: {answered}/{len(results)} perguntas respondidas para user_id {user_id}")
+    if answered == len(results):
+        return True
+    if False not in results:
+        return CIRCUIT_OPEN
+    return False
+
+def begin_question(question):
+    # None se a pergunta foi reservada para este worker; senão, o resultado a devolver
+    question_id = question['question_id']
+    if not processed_questions.claim(question_id):
+        if processed_questions.is_done(question_id):
+            logger.info(f"Pergunta {question_id} já respondida, ignorando")
+            return True
+        # Em andamento em outro worker: a notificação volta para a fila e, na nova
+        # tentativa, a pergunta já estará respondida ou livre para ser processada
+        logger.info(f"Pergunta {question_id} em andamento em outro worker, nova tentativa depois")
+        return False
+    question_stats.record_received(question['seller_id'], question_id, question['date_created'])
+    return None
+
+def cached_answer(question):
+    # (classificação, resposta) de uma pergunta igual ou parecida já respondida, ou None
+    if not ANSWER_CACHE:
+        return None
+    cached = answer_cache.lookup(question['item_id'], question['text'], client_name(question))
+    if cached is None:
+        return None
+    classification = classify_locally(question['text'])[0] or 'Não Identificado'
+    logger.info(f"Resposta da pergunta {question['question_id']} obtida do cache")
+    return classification, cached
+
+def finish_question(question, resposta_gpt, sucesso, classification):
+    # Resposta postada: marca a pergunta como respondida, guarda no cache e monta a linha do banco
+    processed_questions.complete(question['question_id'])
+    if ANSWER_CACHE:
+        answer_cache.add(question['item_id'], question['text'], resposta_gpt, client_name=client_name(question))
+    return {
+        'seller_id': sucesso['seller_id'],
+        'text': sucesso['text'],
+        'item_id': sucesso['item_id'],
+        'date_created': sucesso['date_created'],
+        'answer_text': sucesso['answer']['text'],
+        'answer_date_created': sucesso['answer']['date_created'],
+        'from_id': sucesso['from']['id'],
+        'classification': classification
+    }
+
+def record_stored(question_id, data, stored):
+    # A notificação só é confirmada na fila depois do commit da linha no banco
+    if not stored:
+        raise Exception(f"Resposta da pergunta {question_id} postada, mas não gravada no banco")
+    question_stats.record_answered(data['seller_id'], data['date_created'], data['answer_date_created'], data['classification'])
+    logger.info(f"Pergunta {question_id} processada com sucesso: {data}")
 
 def process_notification(body):
-    with lock:
-        try:
-            logger.info(f"Processando notificação: {body}")
-            user_id = body.get('user_id')
+    notification_coalescer.started(body)
+    try:
+        logger.info(f"Processando notificação: {body}")
+        user_id = body.get('user_id')
+
+        if handle_item_notification(body):
+            return True
 
-            if not user_id:
-                logger.warning("User ID não encontrado no corpo da requisição")
-                return
+        if not user_id:
+            logger.warning("User ID não encontrado no corpo da requisição")
+            return True
 
-            def attempt_to_fetch_questions(access_token):
-                update_response = None  
+        with stage_duration.time('token'):
+            access_token = token_manager.get_access_token(user_id)
+        if not access_token:
+            raise Exception(f"Nenhum access token encontrado para user_id {user_id}")
+
+        with stage_duration.time('fetch_questions'):
+            response = get_received_questions(user_id, access_token)
+        if response.status_code == 401:
+            logger.warning("Token expirado, renovando...")
+            with stage_duration.time('token'):
+                access_token = token_manager.refresh(user_id, stale_token=access_token)
+            if not access_token:
+                raise Exception("Não foi possível obter o refresh token ou atualizar os tokens")
+            with stage_duration.time('fetch_questions'):
                 response = get_received_questions(user_id, access_token)
-                if response.status_code == 401:  
-                    logger.warning("Token expirado, tentando acessar refresh_token...")
-                    refresh_token = get_refresh_token(user_id)
-                    if refresh_token: 
-                        update_response = update_tokens(user_id, refresh_token)
-                    if update_response and update_response.status_code == 200:
-                        access_token = get_access_token(user_id)
-                        if access_token:
-                            return get_received_questions(user_id, access_token)
-                        else:
-                            raise Exception("Falha ao atualizar o token")
-                    else:
-                        if update_response:
-                            update_response.raise_for_status()  # Levanta uma exceção se o status não for 200
-                        else:
-                            raise Exception("Não foi possível obter o refresh token ou atualizar os tokens")
-                return response
-
-            access_token = get_access_token(user_id)
-            response = attempt_to_fetch_questions(access_token)
-            if response.status_code != 200:
-                raise Exception(f"Failed to fetch questions, status code: {response.status_code}")
-
-            response_data = response.json()
-            if not response_data['questions']:
-                raise KeyError('Nenhuma pergunta encontrada no JSON recebido')
-
-            classification = classify_by_chatgpt(response_data)
-            resposta_gpt = answer_by_chatgpt(response_data, classification)
-            sucesso = post_to_meli(response_data['questions'][0]['id'], resposta_gpt, access_token)
-
-            data = {
-                'seller_id': sucesso['seller_id'],
-                'text': sucesso['text'],
-                'item_id': sucesso['item_id'],
-                'date_created': sucesso['date_created'],
-                'answer_text': sucesso['answer']['text'],
-                'answer_date_created': sucesso['answer']['date_created'],
-                'from_id': sucesso['from']['id']
-            }
-
-            store_notification_data(data)
-            logger.info(f"Notificação processada com sucesso: {data}")
+        questions = questions_from_response(user_id, response)
+        if not questions:
+            return True
+
+        with stage_duration.time('enrichment'):
+            questions = enrich_questions(questions, access_token)
+        futures = [answer_executor.submit(answer_question, question, access_token) for question in questions]
+        return notification_result(user_id, [future.result() for future in futures])
+
+    except CircuitOpenError as e:
+        # Recusada pelo disjuntor: não é erro da notificação, só precisa esperar
+        logger.warning(f"Processamento adiado: {e}")
+        return CIRCUIT_OPEN
+
+    except Exception as e:
+        logger.error(f"Ocorreu um erro: {e}")
+        notify_error(e)
+        return False
+
+def answer_question(question, access_token):
+    # Pipeline de uma pergunta: classificar, responder, postar e gravar
+    question_id = question['question_id']
+    skipped = begin_question(question)
+    if skipped is not None:
+        return skipped
+
+    try:
+        classification, resposta_gpt = generate_answer(question)
+        with stage_duration.time('post'):
+            sucesso = post_to_meli(question_id, resposta_gpt, access_token)
+        data = finish_question(question, resposta_gpt, sucesso, classification)
+        with stage_duration.time('db_store'):
+            stored = wait_stored(store_notification_data(data))
+        record_stored(question_id, data, stored)
+        return True
+
+    except CircuitOpenError as e:
+        # Recusada pelo disjuntor: não é erro da notificação, só precisa esperar
+        logger.warning(f"Processamento adiado: {e}")
+        return CIRCUIT_OPEN
+
+    except Exception as e:
+        logger.error(f"Ocorreu um erro na pergunta {question_id}: {e}")
+        notify_error(e)
+        return False
 
+    finally:
+        processed_questions.release(question_id)
+
+def generate_answer(question):
+    cached = cached_answer(question)
+    if cached is not None:
+        return cached
+
+    if LLM_MODE == 'combined':
+        # Se a classificação local resolver, só falta gerar a resposta
+        with stage_duration.time('classify_local'):
+            classification = classify_question(question, use_llm=False)
+        if classification is None:
+            with stage_duration.time('classify_answer'):
+                return classify_and_answer_by_chatgpt(question)
+    else:
+        with stage_duration.time('classify'):
+            classification = classify_question(question)
+    with stage_duration.time('answer'):
+        return classification, answer_by_chatgpt(question, classification)
+
+async def process_notification_async(body):
+    # Mesmo fluxo de process_notification; as perguntas da notificação ficam todas
+    # em andamento ao mesmo tempo, limitadas só pelos limites de cada etapa
+    notification_coalescer.started(body)
+    try:
+        logger.info(f"Processando notificação: {body}")
+        user_id = body.get('user_id')
+
+        if await off_loop(handle_item_notification, body):
+            return True
+
+        if not user_id:
+            logger.warning("User ID não encontrado no corpo da requisição")
+            return True
+
+        # O token_manager pode ir ao banco ou à API de OAuth: fora do event loop
+        with stage_duration.time('token'):
+            access_token = await off_loop(token_manager.get_access_token, user_id)
+        if not access_token:
+            raise Exception(f"Nenhum access token encontrado para user_id {user_id}")
+
+        with stage_duration.time('fetch_questions'):
+            response = await async_functions.get_received_questions(user_id, access_token)
+        if response.status_code == 401:
+            logger.warning("Token expirado, renovando...")
+            with stage_duration.time('token'):
+                access_token = await off_loop(token_manager.refresh, user_id, access_token)
+            if not access_token:
+                raise Exception("Não foi possível obter o refresh token ou atualizar os tokens")
+            with stage_duration.time('fetch_questions'):
+                response = await async_functions.get_received_questions(user_id, access_token)
+        questions = questions_from_response(user_id, response)
+        if not questions:
+            return True
+
+        with stage_duration.time('enrichment'):
+            questions = await async_functions.enrich_questions(questions, access_token)
+        results = await asyncio.gather(*(answer_question_async(question, access_token) for question in questions))
+        return notification_result(user_id, results)
+
+    except CircuitOpenError as e:
+        # Recusada pelo disjuntor: não é erro da notificação, só precisa esperar
+        logger.warning(f"Processamento adiado: {e}")
+        return CIRCUIT_OPEN
+
+    except Exception as e:
+        logger.error(f"Ocorreu um erro: {e}")
+        await off_loop(notify_error, e)
+        return False
+
+async def answer_question_async(question, access_token):
+    question_id = question['question_id']
+    skipped = await off_loop(begin_question, question)
+    if skipped is not None:
+        return skipped
+
+    try:
+        classification, resposta_gpt = await generate_answer_async(question)
+        with stage_duration.time('post'):
+            sucesso = await async_functions.post_to_meli(question_id, resposta_gpt, access_token)
+        data = await off_loop(finish_question, question, resposta_gpt, sucesso, classification)
+        with stage_duration.time('db_store'):
+            stored = await async_functions.store_notification_data(data)
+        await off_loop(record_stored, question_id, data, stored)
+        return True
+
+    except CircuitOpenError as e:
+        # Recusada pelo disjuntor: não é erro da notificação, só precisa esperar
+        logger.warning(f"Processamento adiado: {e}")
+        return CIRCUIT_OPEN
+
+    except Exception as e:
+        logger.error(f"Ocorreu um erro na pergunta {question_id}: {e}")
+        await off_loop(notify_error, e)
+        return False
+
+    finally:
+        await off_loop(processed_questions.release, question_id)
+
+async def generate_answer_async(question):
+    cached = await off_loop(cached_answer, question)
+    if cached is not None:
+        return cached
+
+    # A etapa local tem rótulo próprio para que 'classify' conte uma vez por pergunta
+    with stage_duration.time('classify_local'):
+        classification = classify_question(question, use_llm=False)
+    if classification is None:
+        if LLM_MODE == 'combined':
+            with stage_duration.time('classify_answer'):
+                return await async_functions.classify_and_answer_by_chatgpt(question)
+        with stage_duration.time('classify'):
+            classification = await async_functions.classify_by_chatgpt(question)
+    with stage_duration.time('answer'):
+        return classification, await async_functions.answer_by_chatgpt(question, classification)
+
+def notify_error(error):
+    try:
+        headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+        }
+        url = ''
+        error_data = {"error": str(error)}
+        logger.error(f"Erro: {error_data}")
+        logger.info(f"Enviando erro para rota /notify-error")
+
+        response = http_client.post(url, data=json.dumps(error_data), headers=headers)
+        response.raise_for_status()  
+        logger.info(f"Resposta recebida: {response.text}") 
+    except requests.exceptions.HTTPError as http_err:
+        logger.error(f"Erro HTTP ocorrido: {http_err}")
+        logger.error(f"Conteúdo da resposta: {response.content}")
+    except Exception as e:
+        logger.error(f"Ocorreu um erro ao tentar enviar o POST: {e}")
+        traceback.print_exc()
+
+worker_pool = KeyedWorkerPool(
+    process_job,
+    notification_key,
+    num_workers=NOTIFICATION_WORKERS,
+    name='notification-worker'
+).start()
+
+dispatcher_stop = threading.Event()
+
+# Só o processo que consome a fila devolve os itens reservados por uma execução
+# anterior; os processos de ingestão apenas inserem
+notification_queue.recover()
+
+def dispatch_notifications():
+    # Move as notificações da fila de entrada para os workers, sem reservar mais
+    # do que os workers conseguem processar antes do visibility timeout
+    if PIPELINE_MODE == 'asyncio':
+        max_in_flight = ASYNC_NOTIFICATION_CONCURRENCY
+    else:
+        max_in_flight = NOTIFICATION_WORKERS * 2
+    errors = 0
+    while True:
+        stopping = dispatcher_stop.is_set()
+        if stopping and notification_queue.durable:
+            break
+        receipt = None
+        try:
+            if worker_pool.qsize() >= max_in_flight:
+                dispatcher_stop.wait(0.05)
+                continue
+            receipt, body = notification_queue.get(block=not stopping, timeout=0.5)
+            if receipt is None:
+                if stopping:
+                    break
+                continue
+            if not notification_coalescer.claim_pending(body):
+                # O job pendente do mesmo vendedor já vai buscar esta pergunta
+                notification_queue.ack(receipt)
+                continue
+            worker_pool.put((receipt, body))
+            errors = 0
         except Exception as e:
-            logger.error(f"Ocorreu um erro: {e}")
-            try:
-                headers = {
-                    'Accept': 'application/json',
-                    'Content-Type': 'application/json',
-                }
-                url = ''
-                error_data = {"error": str(e)}
-                logger.error(f"Erro: {error_data}")
-                logger.info(f"Enviando erro para rota /notify-error")
-
-                response = requests.post(url, data=json.dumps(error_data), headers=headers)
-                response.raise_for_status()  
-                logger.info(f"Resposta recebida: {response.text}") 
-            except requests.exceptions.HTTPError as http_err:
-                logger.error(f"Erro HTTP ocorrido: {http_err}")
-                logger.error(f"Conteúdo da resposta: {response.content}")
-            except Exception as e:
-                logger.error(f"Ocorreu um erro ao tentar enviar o POST: {e}")
-                traceback.print_exc()
-
-notification_thread = threading.Thread(target=process_notifications, daemon=True)
-notification_thread.start()
+            # Erro na fila (SQLite bloqueado, disco cheio...) não pode matar o dispatcher:
+            # devolve o item reservado, se houver, e espera cada vez mais até a próxima tentativa
+            errors += 1
+            delay = min(DISPATCH_MAX_BACKOFF, 0.5 * 2 ** min(errors - 1, 10))
+            logger.error(f"Erro ao despachar notificações ({errors} seguidos), nova tentativa em {delay:.1f}s: {e}")
+            traceback.print_exc()
+            if receipt is not None:
+                notification_coalescer.started(body)
+                try:
+                    notification_queue.nack(receipt, body, delay=delay)
+                except Exception as nack_error:
+                    logger.error(f"Erro ao devolver a notificação {receipt} para a fila: {nack_error}")
+            time.sleep(delay)
+
+dispatcher_thread = threading.Thread(target=dispatch_notifications, name='notification-dispatcher', daemon=True)
+dispatcher_thread.start()
+
+BREAKER_STATE_VALUES = {OPEN: 2, HALF_OPEN: 1}
+
+@metrics.register_collector
+def operational_gauges():
+    # Os mesmos números de /queue_size, lidos só quando as métricas são geradas
+    db_pool = pool_stats()
+    db_writes = notification_writer.stats()
+    breakers = circuit_breakers.stats()
+    limits = rate_limiter.stats()
+    return [
+        ('notification_queue_size', 'gauge', 'Notificações na fila ainda não confirmadas',
+         [({}, notification_queue.qsize())]),
+        ('db_pool_connections', 'gauge', 'Conexões do pool do MySQL por estado',
+         [({'state': 'in_use'}, db_pool['in_use']), ({'state': 'size'}, db_pool['size'])]),
+        ('db_pool_timeouts_total', 'counter', 'Esperas por conexão que estouraram o tempo limite',
+         [({}, db_pool['timeouts'])]),
+        ('db_write_pending_rows', 'gauge', 'Linhas aguardando gravação em lote',
+         [({}, db_writes['pending'])]),
+        ('db_write_failed_rows_total', 'counter', 'Linhas descartadas após esgotar as tentativas de gravação',
+         [({}, db_writes['failed_rows'])]),
+        ('pipeline_in_flight', 'gauge', 'Chamadas em andamento por etapa no modo asyncio',
+         [({'stage': stage}, values['in_flight']) for stage, values in async_functions.stage_stats().items()]),
+        ('circuit_breaker_state', 'gauge', 'Estado do disjuntor (0 fechado, 1 sondando, 2 aberto)',
+         [({'endpoint': endpoint}, BREAKER_STATE_VALUES.get(values['state'], 0)) for endpoint, values in breakers.items()]),
+        ('rate_limit_throttled_total', 'counter', 'Respostas 429 por provedor e credencial',
+         [({'limit': name}, values['throttled']) for name, values in limits.items()]),
+        ('rate_limit_waiting', 'gauge', 'Requisições esperando cota por provedor e credencial',
+         [({'limit': name}, values['waiting']) for name, values in limits.items()]),
+    ]
+
+def worker_snapshot():
+    # Publicado em tools/worker_stats.py para as rotas /queue_size e /metrics do Flask
+    return {
+        "dedup": notification_coalescer.stats(),
+        "classifier": classifier_stats(),
+        "pipeline": async_functions.stage_stats(),
+        "db_pool": pool_stats(),
+        "db_writes": notification_writer.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "breakers": circuit_breakers.stats(),
+        "hedging": hedge_stats(),
+        "metrics": metrics.render(),
+    }
+
+stats_thread = start_publisher(worker_snapshot, dispatcher_stop)
+
+_shutdown_lock = threading.Lock()
+_shutdown_done = False
+
+def shutdown_notification_workers():
+    # Encerramento em ordem: dispatcher, workers (drenando o que já foi retirado da
+    # fila), executores e, por último, o buffer de gravação e as estatísticas, que
+    # recebem as linhas das perguntas respondidas durante a drenagem.
+    # Na fila persistente, o que não foi retirado fica para o próximo início;
+    # na fila em memória, tudo o que foi recebido é processado antes de sair.
+    # worker.py chama esta função ao receber SIGTERM/SIGINT, antes de o interpretador
+    # começar a encerrar os executores; o atexit cobre as demais saídas.
+    global _shutdown_done
+    with _shutdown_lock:
+        if _shutdown_done:
+            return
+        _shutdown_done = True
+    dispatcher_stop.set()
+    dispatcher_thread.join(NOTIFICATION_SHUTDOWN_TIMEOUT)
+    stats_thread.join(NOTIFICATION_SHUTDOWN_TIMEOUT)
+    worker_pool.shutdown(wait=True, timeout=NOTIFICATION_SHUTDOWN_TIMEOUT)
+    answer_executor.shutdown(wait=True)
+    enrichment_executor.shutdown(wait=True)
+    async_functions.db_executor.shutdown(wait=True)
+    if PIPELINE_MODE == 'asyncio':
+        async_http.close_session()
+    if DB_WRITE_BEHIND:
+        notification_writer.close()
+    if STATS_ENABLED:
+        question_stats.close()
+
+atexit.register(shutdown_notification_workers)
@@ -0,0 +1,292 @@
+import itertools
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+
+# Intervalo máximo entre consultas à fila, para enxergar itens inseridos por outros processos
+POLL_INTERVAL = 0.5
+
+
+def _is_dead_local_owner(owner, host):
+    owner_host, _, pid = owner.rpartition(':')
+    if owner_host != host or not pid.isdigit():
+        return False
+    pid = int(pid)
+    if pid == os.getpid():
+        # recover() roda antes de este processo reservar qualquer item: é de uma execução anterior
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+class MemoryQueue:
+    # Fila em memória com a mesma interface da SQLiteQueue (put/get/ack/nack);
+    # itens não confirmados, inclusive os aguardando nova tentativa, se perdem
+    # se o processo reiniciar
+
+    durable = False
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._ids = itertools.count(1)
+        self._unacked = 0
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        with self._lock:
+            self._unacked += 1
+        self._queue.put((next(self._ids), item))
+
+    def get(self, block=True, timeout=None):
+        try:
+            return self._queue.get(block=block, timeout=timeout)
+        except queue.Empty:
+            return None, None
+
+    def ack(self, receipt):
+        with self._lock:
+            self._unacked -= 1
+
+    def nack(self, receipt, item, delay=0, count_attempt=True):
+        if delay <= 0:
+            self._queue.put((receipt, item))
+            return
+        timer = threading.Timer(delay, self._queue.put, args=((receipt, item),))
+        timer.daemon = True
+        timer.start()
+
+    def recover(self):
+        pass
+
+    def qsize(self):
+        with self._lock:
+            return self._unacked
+
+
+class SQLiteQueue:
+    # Fila persistente (SQLite em modo WAL) com entrega at-least-once: um item
+    # retirado fica invisível por visibility_timeout segundos e volta para a fila
+    # se não for confirmado com ack; após max_attempts vai para queue_dead
+
+    durable = True
+
+    def __init__(self, path, visibility_timeout=300, max_attempts=5):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._cond = threading.Condition()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS queue ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, '
+            'enqueued_at REAL NOT NULL, visible_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_queue_visible_at ON queue (visible_at, id)')
+        # owner: host:pid de quem reservou o item; lease: identifica cada entrega,
+        # para que ack/nack de uma reserva já expirada não mexa na entrega seguinte
+        self._add_column('owner')
+        self._add_column('lease')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS queue_dead ('
+            'id INTEGER PRIMARY KEY, payload TEXT NOT NULL, enqueued_at REAL NOT NULL, '
+            'attempts INTEGER NOT NULL, failed_at REAL NOT NULL)'
+        )
+        # Janela de repetição das notificações (tools/dedup.py), compartilhada pelos
+        # processos de ingestão que usam o mesmo arquivo
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS queue_seen ('
+            'user_id TEXT NOT NULL, resource TEXT NOT NULL, topic TEXT NOT NULL, '
+            'seen_at REAL NOT NULL, PRIMARY KEY (user_id, resource, topic))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_queue_seen_seen_at ON queue_seen (seen_at)')
+        self._last_seen_prune = 0.0
+
+    def _add_column(self, name):
+        # Filas criadas antes da coluna
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(queue)')]
+        if name in columns:
+            return
+        try:
+            self._conn.execute(f'ALTER TABLE queue ADD COLUMN {name} TEXT')
+        except sqlite3.OperationalError as e:
+            # Outro processo adicionou a coluna ao mesmo tempo
+            if 'duplicate column' not in str(e):
+                raise
+
+    @contextmanager
+    def _transaction(self, begin='BEGIN'):
+        # Qualquer erro no meio (disco cheio, banco bloqueado...) desfaz a transação;
+        # sem o ROLLBACK a conexão ficaria presa nela e todo BEGIN seguinte falharia
+        self._conn.execute(begin)
+        try:
+            yield
+            self._conn.execute('COMMIT')
+        except BaseException:
+            if self._conn.in_transaction:
+                self._conn.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def owner():
+        # Calculado a cada reserva: o pid muda se o processo for bifurcado depois de abrir a fila
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def recover(self):
+        # Itens reservados por um consumidor que caiu voltam a ficar visíveis na hora,
+        # sem esperar o visibility timeout. Só são reclamados os itens de processos
+        # deste host que não existem mais (ou de uma execução anterior com o mesmo pid);
+        # os de outros consumidores vivos, inclusive os atrasados por nack, ficam como
+        # estão, e os de outros hosts voltam quando a reserva expirar.
+        host = socket.gethostname()
+        with self._cond:
+            owners = [row[0] for row in self._conn.execute(
+                'SELECT DISTINCT owner FROM queue WHERE owner IS NOT NULL AND visible_at > ?', (time.time(),)
+            )]
+            dead = [owner for owner in owners if _is_dead_local_owner(owner, host)]
+            recovered = 0
+            for owner in dead:
+                cursor = self._conn.execute(
+                    'UPDATE queue SET visible_at = ?, owner = NULL, lease = NULL WHERE owner = ?', (time.time(), owner)
+                )
+                recovered += cursor.rowcount
+            pending = self._conn.execute('SELECT COUNT(*) FROM queue').fetchone()[0]
+        logger.info(f"Fila {self.path}: {pending} itens pendentes, {recovered} recuperados de processamento interrompido")
+
+    def put(self, item):
+        now = time.time()
+        payload = json.dumps(item, ensure_ascii=False)
+        with self._cond:
+            self._conn.execute(
+                'INSERT INTO queue (payload, enqueued_at, visible_at) VALUES (?, ?, ?)',
+                (payload, now, now)
+            )
+            self._cond.notify()
+
+    def get(self, block=True, timeout=None):
+        # O recibo é (id, lease): só a entrega que o recebeu pode confirmar ou devolver o item
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                lease = uuid.uuid4().hex
+                # BEGIN IMMEDIATE impede que outro processo reserve o mesmo item
+                with self._transaction('BEGIN IMMEDIATE'):
+                    row = self._conn.execute(
+                        'SELECT id, payload FROM queue WHERE visible_at <= ? ORDER BY id LIMIT 1',
+                        (now,)
+                    ).fetchone()
+                    if row is not None:
+                        self._conn.execute(
+                            'UPDATE queue SET visible_at = ?, attempts = attempts + 1, owner = ?, lease = ? WHERE id = ?',
+                            (now + self.visibility_timeout, self.owner(), lease, row[0])
+                        )
+                if row is not None:
+                    return (row[0], lease), json.loads(row[1])
+
+                if not block:
+                    return None, None
+                wait = self._next_visible_in(now)
+                wait = POLL_INTERVAL if wait is None else min(wait, POLL_INTERVAL)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None, None
+                    wait = min(wait, remaining)
+                self._cond.wait(wait)
+
+    def _next_visible_in(self, now):
+        row = self._conn.execute('SELECT MIN(visible_at) FROM queue').fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - now)
+
+    def ack(self, receipt):
+        item_id, lease = receipt
+        with self._cond:
+            cursor = self._conn.execute('DELETE FROM queue WHERE id = ? AND lease = ?', (item_id, lease))
+        if cursor.rowcount == 0:
+            logger.warning(f"Item {item_id}: reserva expirada, confirmação ignorada (o item foi entregue de novo)")
+
+    def nack(self, receipt, item, delay=0, count_attempt=True):
+        # item, se informado, substitui o payload gravado (ex.: queued_at atualizado);
+        # com count_attempt=False a tentativa contada no get é devolvida
+        item_id, lease = receipt
+        with self._cond:
+            with self._transaction('BEGIN IMMEDIATE'):
+                row = self._conn.execute(
+                    'SELECT payload, enqueued_at, attempts FROM queue WHERE id = ? AND lease = ?', (item_id, lease)
+                ).fetchone()
+                if row is None:
+                    logger.warning(f"Item {item_id}: reserva expirada, devolução ignorada (o item foi entregue de novo)")
+                    return
+                payload, enqueued_at, attempts = row
+                if not count_attempt:
+                    attempts = max(0, attempts - 1)
+                elif attempts >= self.max_attempts:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO queue_dead (id, payload, enqueued_at, attempts, failed_at) VALUES (?, ?, ?, ?, ?)',
+                        (item_id, payload, enqueued_at, attempts, time.time())
+                    )
+                    self._conn.execute('DELETE FROM queue WHERE id = ?', (item_id,))
+                    logger.error(f"Item {item_id} descartado após {attempts} tentativas: {payload}")
+                    return
+                if item is not None:
+                    payload = json.dumps(item, ensure_ascii=False)
+                self._conn.execute(
+                    'UPDATE queue SET visible_at = ?, owner = NULL, lease = NULL, payload = ?, attempts = ? WHERE id = ?',
+                    (time.time() + delay, payload, attempts, item_id)
+                )
+            self._cond.notify()
+
+    def first_in_window(self, key, window):
+        # True e registra a chave (user_id, resource, topic) se ela não foi vista nos
+        # últimos window segundos; BEGIN IMMEDIATE garante um único True entre processos
+        key = tuple(str(part) for part in key)
+        now = time.time()
+        with self._cond:
+            with self._transaction('BEGIN IMMEDIATE'):
+                if now - self._last_seen_prune >= window:
+                    self._conn.execute('DELETE FROM queue_seen WHERE seen_at <= ?', (now - window,))
+                    self._last_seen_prune = now
+                row = self._conn.execute(
+                    'SELECT seen_at FROM queue_seen WHERE user_id = ? AND resource = ? AND topic = ?', key
+                ).fetchone()
+                if row is not None and now - row[0] < window:
+                    return False
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO queue_seen (user_id, resource, topic, seen_at) VALUES (?, ?, ?, ?)',
+                    key + (now,)
+                )
+                return True
+
+    def qsize(self):
+        with self._cond:
+            return self._conn.execute('SELECT COUNT(*) FROM queue').fetchone()[0]
@@ -0,0 +1,95 @@
+import math
+import os
+import re
+import logging
+import sys
+from tools.utils import prompts
+from tools.text import normalize
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Orçamento (estimado) de tokens do contexto da pergunta e tamanho máximo da descrição
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '1200'))
+DESCRIPTION_MAX_CHARS = int(os.getenv('DESCRIPTION_MAX_CHARS', '2000'))
+
+# Em português o tokenizer do GPT gera em média ~1,3 tokens por palavra
+TOKENS_PER_WORD = 1.3
+
+_token_pattern = re.compile(r'\w+|[^\w\s]')
+
+
+def estimate_tokens(text):
+    return math.ceil(len(_token_pattern.findall(text)) * TOKENS_PER_WORD)
+
+
+def _truncate(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(' ', 1)[0] + '...'
+
+
+def client_name(question):
+    client_info = question.get('client_info') or {}
+    return client_info.get('first_name') or client_info.get('nickname')
+
+
+def build_question_context(question):
+    # Só os campos que a resposta precisa, em vez do JSON completo da API
+    details = question.get('item_details') or {}
+    attributes = '; '.join(
+        f"{attribute.get('name')}: {attribute.get('value')}" for attribute in details.get('attributes', [])
+    )
+    return {
+        'Pergunta': question.get('text', ''),
+        'Cliente': client_name(question),
+        'Produto': details.get('item_title'),
+        'Condição': details.get('item_condition'),
+        'Quantidade disponível': details.get('available_quantity'),
+        'Garantia': details.get('warranty_time'),
+        'Atributos': attributes,
+        'Descrição': _truncate(question.get('item_description') or '', DESCRIPTION_MAX_CHARS),
+    }
+
+
+def render_context(context):
+    return '\n'.join(f"{key}: {value}" for key, value in context.items() if value not in (None, ''))
+
+
+def compact_context(question, budget=PROMPT_TOKEN_BUDGET):
+    # Encolhe a descrição (e, em último caso, os atributos) até caber no orçamento
+    context = build_question_context(question)
+    text = render_context(context)
+    while estimate_tokens(text) > budget and context['Descrição']:
+        context['Descrição'] = _truncate(context['Descrição'], len(context['Descrição']) // 2) if len(context['Descrição']) > 40 else ''
+        text = render_context(context)
+    if estimate_tokens(text) > budget:
+        context['Atributos'] = ''
+        text = render_context(context)
+    return text
+
+
+def relevant_prompts(classification):
+    # Só as instruções da categoria identificada (e a saudação); sem categoria, todas
+    selected = {}
+    wanted = normalize(classification or '')
+    for entry in prompts:
+        for category, instruction in entry.items():
+            if not instruction:
+                continue
+            if category == 'Saudação' or not wanted or normalize(category) in wanted:
+                selected[category] = instruction
+    return selected
+
+
+def log_prompt_size(kind, content):
+    logger.info(f"Prompt de {kind}: ~{estimate_tokens(content)} tokens estimados ({len(content)} caracteres)")
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from tools.user_config import user_config
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Limites por (provedor, credencial): a cota do Mercado Livre é por aplicativo
+# (app_id do user_config) e a da OpenAI por chave, em requisições e tokens por minuto
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+MELI_REQUESTS_PER_MINUTE = float(os.getenv('MELI_REQUESTS_PER_MINUTE', '1500'))
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv('OPENAI_REQUESTS_PER_MINUTE', '500'))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv('OPENAI_TOKENS_PER_MINUTE', '30000'))
+# Rajada aceita de uma vez, em segundos de cota
+RATE_LIMIT_BURST_SECONDS = float(os.getenv('RATE_LIMIT_BURST_SECONDS', '10'))
+# Pausa quando um 429 chega sem Retry-After, e quantas vezes o 429 é repetido
+RATE_LIMIT_DEFAULT_BACKOFF = float(os.getenv('RATE_LIMIT_DEFAULT_BACKOFF', '5'))
+RATE_LIMIT_RETRIES = int(os.getenv('RATE_LIMIT_RETRIES', '2'))
+
+RATE_LIMITED_HOSTS = {
+    'api.mercadolibre.com': 'meli',
+    'api.openai.com': 'openai',
+}
+
+# Prioridades (menor sai primeiro): postar respostas, depois buscar perguntas e
+# chamar o GPT, por último os dados de enriquecimento (itens, descrições, compradores)
+PRIORITY_POST = 0
+PRIORITY_QUESTIONS = 1
+PRIORITY_ENRICHMENT = 2
+
+OPENAI_CREDENTIAL = 'OPENAI_API_KEY'
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+class TokenBucket:
+    # Enche `rate` fichas por segundo até `capacity`; o saldo pode ficar negativo
+    # quando o consumo só é conhecido depois (tokens do GPT)
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * RATE_LIMIT_BURST_SECONDS)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount):
+        # Segundos até o saldo chegar a `amount`
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class _Limit:
+    def __init__(self, requests_per_minute, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.blocked_until = 0.0
+        self.waiting = {}
+        self.stats = {'acquired': 0, 'throttled': 0, 'wait_total': 0.0, 'tokens_used': 0}
+
+    def take(self, priority, now):
+        # 0 se a requisição pode sair agora; senão quantos segundos esperar
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if any(count for waiting_priority, count in self.waiting.items() if waiting_priority < priority):
+            return 0.05
+        self.requests.refill(now)
+        wait = self.requests.wait_for(1)
+        if self.tokens is not None:
+            self.tokens.refill(now)
+            wait = max(wait, self.tokens.wait_for(0))
+        if wait > 0:
+            return wait
+        self.requests.level -= 1
+        return 0.0
+
+
+class RateLimiter:
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._limits = {}
+        self._cond = threading.Condition()
+
+    def _limit(self, key):
+        limit = self._limits.get(key)
+        if limit is None:
+            provider = key[0]
+            if provider == 'openai':
+                limit = _Limit(OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE)
+            else:
+                limit = _Limit(MELI_REQUESTS_PER_MINUTE)
+            self._limits[key] = limit
+        return limit
+
+    def key_for(self, url, headers=None):
+        # (provedor, credencial) da requisição, ou None para hosts sem limite
+        if not self.enabled:
+            return None
+        provider = RATE_LIMITED_HOSTS.get(urlparse(url).netloc)
+        if provider is None:
+            return None
+        if provider == 'openai':
+            return provider, OPENAI_CREDENTIAL
+        authorization = (headers or {}).get('Authorization', '')
+        return provider, credential_for_token(authorization[len('Bearer '):]) if authorization.startswith('Bearer ') else 'default'
+
+    def acquire(self, key, priority=PRIORITY_ENRICHMENT, timeout=None):
+        start = time.monotonic()
+        with self._cond:
+            limit = self._limit(key)
+            limit.waiting[priority] = limit.waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = limit.take(priority, now)
+                    if not wait:
+                        self._acquired(limit, now - start)
+                        return now - start
+                    if timeout is not None and now + wait > start + timeout:
+                        raise RateLimitTimeout(f"Cota de {key[0]} esgotada para {key[1]}")
+                    self._cond.wait(min(wait, 1.0))
+            finally:
+                limit.waiting[priority] -= 1
+                self._cond.notify_all()
+
+    async def acquire_async(self, key, priority=PRIORITY_ENRICHMENT):
+        # Mesma fila de acquire, esperando com asyncio.sleep para não travar o event loop
+        start = time.monotonic()
+        with self._cond:
+            limit = self._limit(key)
+            limit.waiting[priority] = limit.waiting.get(priority, 0) + 1
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = limit.take(priority, now)
+                    if not wait:
+                        self._acquired(limit, now - start)
+                        return now - start
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            with self._cond:
+                limit.waiting[priority] -= 1
+                self._cond.notify_all()
+
+    @staticmethod
+    def _acquired(limit, waited):
+        limit.stats['acquired'] += 1
+        limit.stats['wait_total'] += waited
+
+    def throttled(self, key, retry_after=None):
+        # 429: ninguém usa a credencial até o fim do Retry-After
+        delay = parse_retry_after(retry_after)
+        with self._cond:
+            limit = self._limit(key)
+            limit.blocked_until = max(limit.blocked_until, time.monotonic() + delay)
+            limit.stats['throttled'] += 1
+        logger.warning(f"429 de {key[0]} para {key[1]}, pausando por {delay:.1f}s")
+        return delay
+
+    def record_tokens(self, key, total_tokens):
+        # Desconta do limite de tokens por minuto o consumo informado em `usage`
+        if not self.enabled or not total_tokens:
+            return
+        with self._cond:
+            limit = self._limit(key)
+            if limit.tokens is not None:
+                limit.tokens.refill(time.monotonic())
+                limit.tokens.level -= total_tokens
+            limit.stats['tokens_used'] += total_tokens
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            result = {}
+            for (provider, credential), limit in self._limits.items():
+                limit.requests.refill(now)
+                acquired = limit.stats['acquired']
+                entry = {
+                    'available': round(limit.requests.level, 2),
+                    'blocked_for': round(max(0.0, limit.blocked_until - now), 2),
+                    'waiting': sum(limit.waiting.values()),
+                    'acquired': acquired,
+                    'throttled': limit.stats['throttled'],
+                    'avg_wait_ms': round(limit.stats['wait_total'] / acquired * 1000, 2) if acquired else 0.0,
+                }
+                if limit.tokens is not None:
+                    limit.tokens.refill(now)
+                    entry['tokens_available'] = round(limit.tokens.level)
+                    entry['tokens_used'] = limit.stats['tokens_used']
+                result[f'{provider}:{credential}'] = entry
+            return result
+
+
+def parse_retry_after(value):
+    # Retry-After em segundos ou como data HTTP
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return RATE_LIMIT_DEFAULT_BACKOFF
+
+
+def credential_for_token(access_token):
+    # O token identifica o vendedor; a cota é do aplicativo configurado para ele.
+    # Importado aqui porque token_manager depende de database, que depende de functions
+    from tools.token_manager import token_manager
+    user_id = token_manager.user_for_token(access_token)
+    if user_id is None:
+        return 'default'
+    config = user_config.get(user_id) or user_config.get(str(user_id))
+    return config.get('app_id', str(user_id)) if config else str(user_id)
+
+
+rate_limiter = RateLimiter(enabled=RATE_LIMIT_ENABLED)
@@ -0,0 +1,248 @@
+import os
+import threading
+from datetime import datetime, date, timedelta
+import mysql.connector
+from tools.database import get_connection
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Estatísticas diárias por loja (migrations/002_perguntas_stats.sql), acumuladas em
+# memória e somadas às tabelas a cada STATS_FLUSH_INTERVAL segundos
+STATS_ENABLED = os.getenv('STATS_ENABLED', '1') == '1'
+STATS_FLUSH_INTERVAL = float(os.getenv('STATS_FLUSH_INTERVAL', '10'))
+# Dias que o id de uma pergunta recebida fica em perguntas_recebidas (migrations/004)
+STATS_RECEIVED_RETENTION_DAYS = int(os.getenv('STATS_RECEIVED_RETENTION_DAYS', '30'))
+
+# Limite superior (minutos) de cada faixa do histograma de tempo de resposta; a
+# última faixa (None) recebe tudo acima de 24 horas
+RESPONSE_TIME_BUCKETS = (1, 5, 15, 30, 60, 120, 240, 480, 1440, None)
+OPEN_BUCKET = len(RESPONSE_TIME_BUCKETS) - 1
+
+UPSERT_DAILY = '''
+    INSERT INTO perguntas_stats_diarias (loja, dia, recebidas, respondidas)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE recebidas = recebidas + VALUES(recebidas), respondidas = respondidas + VALUES(respondidas)
+'''
+# rowcount conta só as perguntas ainda não registradas: é o incremento de recebidas
+INSERT_RECEIVED = '''
+    INSERT IGNORE INTO perguntas_recebidas (question_id, loja, dia)
+    VALUES (%s, %s, %s)
+'''
+PURGE_RECEIVED = 'DELETE FROM perguntas_recebidas WHERE dia < %s'
+UPSERT_RESPONSE_TIME = '''
+    INSERT INTO perguntas_stats_tempo (loja, dia, faixa, total)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE total = total + VALUES(total)
+'''
+UPSERT_CATEGORY = '''
+    INSERT INTO perguntas_stats_categorias (loja, dia, categoria, total)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE total = total + VALUES(total)
+'''
+
+
+def parse_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def response_time_bucket(minutes):
+    for index, limit in enumerate(RESPONSE_TIME_BUCKETS[:-1]):
+        if minutes <= limit:
+            return index
+    return OPEN_BUCKET
+
+
+def median_from_histogram(counts):
+    # Estimativa da mediana: limite superior da faixa que contém a metade das respostas
+    total = sum(counts.values())
+    if not total:
+        return None
+    cumulative = 0
+    for bucket in sorted(counts):
+        cumulative += counts[bucket]
+        if cumulative * 2 >= total:
+            return RESPONSE_TIME_BUCKETS[bucket] if bucket != OPEN_BUCKET else RESPONSE_TIME_BUCKETS[-2]
+    return None
+
+
+class DailyRollup:
+    # Contadores por (loja, dia) somados em memória; cada flush grava só os
+    # incrementos desde o flush anterior, numa transação. As perguntas recebidas
+    # são contadas pelo id em perguntas_recebidas, que vale entre reinícios e processos
+
+    def __init__(self, flush_interval=STATS_FLUSH_INTERVAL, enabled=True):
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._daily = {}
+        self._response_times = {}
+        self._categories = {}
+        self._received = {}
+        self._purged_on = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stats-rollup', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def record_received(self, loja, question_id, asked_at):
+        # Uma pergunta reprocessada depois de uma falha conta uma vez só (INSERT IGNORE no flush)
+        if not self.enabled:
+            return
+        day = self._day(asked_at)
+        with self._lock:
+            self._received.setdefault((str(loja), day), set()).add(question_id)
+
+    def record_answered(self, loja, asked_at, answered_at, category=None):
+        if not self.enabled:
+            return
+        asked = parse_datetime(asked_at)
+        answered = parse_datetime(answered_at)
+        day = self._day(asked)
+        loja = str(loja)
+        with self._lock:
+            counters = self._daily.setdefault((loja, day), [0, 0])
+            counters[1] += 1
+            if asked and answered:
+                minutes = max(0.0, (answered - asked).total_seconds() / 60)
+                key = (loja, day, response_time_bucket(minutes))
+                self._response_times[key] = self._response_times.get(key, 0) + 1
+            if category:
+                key = (loja, day, category[:64])
+                self._categories[key] = self._categories.get(key, 0) + 1
+
+    @staticmethod
+    def _day(value):
+        parsed = parse_datetime(value) if value else None
+        # Dia no fuso da data informada pelo Mercado Livre, o mesmo exibido ao vendedor
+        return (parsed.date() if parsed else date.today()).isoformat()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            daily, self._daily = self._daily, {}
+            received, self._received = self._received, {}
+            response_times, self._response_times = self._response_times, {}
+            categories, self._categories = self._categories, {}
+        if not (daily or received or response_times or categories):
+            return
+
+        today = date.today()
+        try:
+            with get_connection() as connection, connection.cursor() as cursor:
+                try:
+                    # Cópia: se a transação falhar, daily e received voltam para a memória sem as somas abaixo
+                    rows = {key: list(counts) for key, counts in daily.items()}
+                    for (loja, day), question_ids in received.items():
+                        cursor.executemany(INSERT_RECEIVED, [(question_id, loja, day) for question_id in question_ids])
+                        if cursor.rowcount > 0:
+                            rows.setdefault((loja, day), [0, 0])[0] += cursor.rowcount
+                    if rows:
+                        cursor.executemany(UPSERT_DAILY, [key + tuple(counts) for key, counts in rows.items()])
+                    if response_times:
+                        cursor.executemany(UPSERT_RESPONSE_TIME, [key + (total,) for key, total in response_times.items()])
+                    if categories:
+                        cursor.executemany(UPSERT_CATEGORY, [key + (total,) for key, total in categories.items()])
+                    if self._purged_on != today:
+                        cursor.execute(PURGE_RECEIVED, ((today - timedelta(days=STATS_RECEIVED_RETENTION_DAYS)).isoformat(),))
+                    connection.commit()
+                    self._purged_on = today
+                except mysql.connector.Error:
+                    connection.rollback()
+                    raise
+        except mysql.connector.Error as error:
+            # Os incrementos voltam para a memória e entram no próximo flush
+            logger.error(f"Erro ao gravar estatísticas diárias: {error}")
+            self._merge(daily, received, response_times, categories)
+
+    def _merge(self, daily, received, response_times, categories):
+        with self._lock:
+            for key, counts in daily.items():
+                counters = self._daily.setdefault(key, [0, 0])
+                counters[0] += counts[0]
+                counters[1] += counts[1]
+            for key, question_ids in received.items():
+                self._received.setdefault(key, set()).update(question_ids)
+            for key, total in response_times.items():
+                self._response_times[key] = self._response_times.get(key, 0) + total
+            for key, total in categories.items():
+                self._categories[key] = self._categories.get(key, 0) + total
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+
+question_stats = DailyRollup(enabled=STATS_ENABLED)
+if STATS_ENABLED:
+    # Fechado por tools/notification.shutdown_notification_workers, depois da drenagem dos workers
+    question_stats.start()
+
+
+def get_daily_stats(date_from, date_to, loja=None):
+    # Lê só as linhas agregadas do período: o custo depende do número de dias e
+    # lojas, não do tamanho da tabela perguntas
+    conditions = ['dia BETWEEN %s AND %s']
+    params = [date_from.isoformat(), date_to.isoformat()]
+    if loja:
+        conditions.append('loja = %s')
+        params.append(loja)
+    where = ' AND '.join(conditions)
+
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(f'SELECT loja, dia, recebidas, respondidas FROM perguntas_stats_diarias WHERE {where}', params)
+        daily = cursor.fetchall()
+        cursor.execute(f'SELECT loja, dia, faixa, total FROM perguntas_stats_tempo WHERE {where}', params)
+        response_times = cursor.fetchall()
+        cursor.execute(f'SELECT loja, dia, categoria, total FROM perguntas_stats_categorias WHERE {where}', params)
+        categories = cursor.fetchall()
+
+    stats = {}
+
+    def entry(loja, dia):
+        return stats.setdefault((str(loja), str(dia)), {
+            'loja': str(loja), 'dia': str(dia), 'recebidas': 0, 'respondidas': 0,
+            'histograma': {}, 'categorias': {},
+        })
+
+    for loja, dia, recebidas, respondidas in daily:
+        item = entry(loja, dia)
+        item['recebidas'] = int(recebidas)
+        item['respondidas'] = int(respondidas)
+    for loja, dia, faixa, total in response_times:
+        entry(loja, dia)['histograma'][int(faixa)] = int(total)
+    for loja, dia, categoria, total in categories:
+        entry(loja, dia)['categorias'][categoria] = int(total)
+
+    result = []
+    for key in sorted(stats):
+        item = stats[key]
+        item['taxa_resposta'] = round(item['respondidas'] / item['recebidas'], 4) if item['recebidas'] else None
+        item['mediana_minutos'] = median_from_histogram(item['histograma'])
+        item['histograma'] = {
+            (f"ate_{RESPONSE_TIME_BUCKETS[faixa]}" if faixa != OPEN_BUCKET else f"acima_{RESPONSE_TIME_BUCKETS[-2]}"): total
+            for faixa, total in sorted(item['histograma'].items())
+        }
+        result.append(item)
+    return result
@@ -0,0 +1,10 @@
+import re
+import unicodedata
+
+
+def normalize(text):
+    # Minúsculas, sem acentos e sem pontuação: "Vem montádo?" -> "vem montado"
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
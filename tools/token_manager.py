@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+import logging
+import sys
+from tools.database import get_access_token, get_refresh_token, update_tokens, store_token
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# Renova o token quando faltar menos que TOKEN_REFRESH_MARGIN segundos para expirar
+TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', '600'))
+TOKEN_REFRESH_CHECK_INTERVAL = int(os.getenv('TOKEN_REFRESH_CHECK_INTERVAL', '60'))
+
+
+class TokenManager:
+    # Mantém os tokens de cada vendedor em memória e os renova antes de expirar.
+    # O access_token é lido do banco na primeira vez; o refresh_token é relido a cada
+    # renovação, pois outro processo (ou o login em /auth) pode tê-lo trocado.
+    # O par novo é gravado no banco (update_tokens) antes de ser usado em memória.
+
+    def __init__(self, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._tokens = {}
+        self._user_locks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _user_lock(self, user_id):
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def set_tokens(self, user_id, access_token, refresh_token, expires_in=None, persisted=True):
+        expires_at = time.time() + expires_in if expires_in else None
+        with self._lock:
+            self._tokens[user_id] = {
+                'access_token': access_token,
+                'refresh_token': refresh_token,
+                'expires_at': expires_at,
+                # False se a gravação falhou: o par só existe aqui e o refresher tenta gravar de novo
+                'persisted': persisted,
+            }
+
+    def get_access_token(self, user_id):
+        entry = self._tokens.get(user_id)
+        if entry is None:
+            with self._user_lock(user_id):
+                entry = self._tokens.get(user_id)
+                if entry is None:
+                    access_token = get_access_token(user_id)
+                    if not access_token:
+                        return None
+                    # Validade desconhecida: o refresher renova no próximo ciclo
+                    self.set_tokens(user_id, access_token, None)
+                    entry = self._tokens[user_id]
+        if entry['expires_at'] is not None and entry['expires_at'] <= time.time():
+            return self.refresh(user_id, stale_token=entry['access_token'])
+        return entry['access_token']
+
+    def refresh(self, user_id, stale_token=None):
+        # Single-flight: se outro worker já renovou o token enquanto este esperava
+        # pela trava, devolve o token novo sem chamar a API de novo
+        with self._user_lock(user_id):
+            entry = self._tokens.get(user_id)
+            if entry is not None and stale_token is not None and entry['access_token'] != stale_token:
+                return entry['access_token']
+
+            refresh_token = self._current_refresh_token(user_id, entry)
+            tokens = update_tokens(user_id, refresh_token)
+            if not tokens:
+                # Outro processo pode ter renovado (e invalidado o nosso refresh_token)
+                # entre a leitura e a chamada: tenta uma vez com o que estiver no banco
+                latest = self._stored_refresh_token(user_id)
+                if latest and latest != refresh_token:
+                    tokens = update_tokens(user_id, latest)
+            if not tokens:
+                logger.error(f"Não foi possível renovar o token do user_id {user_id}")
+                return None
+
+            persisted = tokens.get('persisted', True)
+            if not persisted:
+                logger.error(f"Tokens renovados do user_id {user_id} não foram gravados no banco, nova tentativa no próximo ciclo")
+            self.set_tokens(user_id, tokens['access_token'], tokens['refresh_token'], tokens.get('expires_in'), persisted)
+            logger.info(f"Token do user_id {user_id} renovado, expira em {tokens.get('expires_in')}s")
+            return tokens['access_token']
+
+    def _stored_refresh_token(self, user_id):
+        try:
+            return get_refresh_token(user_id)
+        except Exception as e:
+            logger.error(f"Erro ao ler o refresh token do user_id {user_id} no banco: {e}")
+            return None
+
+    def _current_refresh_token(self, user_id, entry):
+        # Um par que não chegou ao banco é mais novo que o do banco; fora isso o banco
+        # é a fonte da verdade e a cópia em memória só serve se ele não responder
+        if entry and entry['refresh_token'] and not entry['persisted']:
+            return entry['refresh_token']
+        return self._stored_refresh_token(user_id) or (entry['refresh_token'] if entry else None)
+
+    def _persist_pending(self):
+        with self._lock:
+            pending = [(user_id, dict(entry)) for user_id, entry in self._tokens.items() if not entry['persisted']]
+        for user_id, entry in pending:
+            with self._user_lock(user_id):
+                current = self._tokens.get(user_id)
+                if current is None or current['access_token'] != entry['access_token']:
+                    continue
+                _, status = store_token(entry['refresh_token'], entry['access_token'], user_id)
+                if status == 200:
+                    current['persisted'] = True
+                    logger.info(f"Tokens pendentes do user_id {user_id} gravados no banco")
+
+    def user_for_token(self, access_token):
+        with self._lock:
+            for user_id, entry in self._tokens.items():
+                if entry['access_token'] == access_token:
+                    return user_id
+        return None
+
+    def _due(self):
+        now = time.time()
+        with self._lock:
+            return [
+                (user_id, entry['access_token']) for user_id, entry in self._tokens.items()
+                if entry['expires_at'] is None or entry['expires_at'] - now <= self.refresh_margin
+            ]
+
+    def _run(self):
+        while not self._stop.wait(TOKEN_REFRESH_CHECK_INTERVAL):
+            try:
+                self._persist_pending()
+            except Exception as e:
+                logger.error(f"Erro ao gravar tokens pendentes: {e}")
+            for user_id, access_token in self._due():
+                try:
+                    self.refresh(user_id, stale_token=access_token)
+                except Exception as e:
+                    logger.error(f"Erro ao renovar token do user_id {user_id} em segundo plano: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='token-refresher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+token_manager = TokenManager().start()
@@ -1,13 +1,13 @@
-from dotenv import load_dotenv
-
-load_dotenv()
-
-username = {""}
-
-user_config = {
-
-}
-
-user_config_number = {
-
+from dotenv import load_dotenv
+
+load_dotenv()
+
+username = {""}
+
+user_config = {
+
+}
+
+user_config_number = {
+
 }
\ No newline at end of file
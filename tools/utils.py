@@ -1,55 +1,55 @@
-redirect_urls = {
-    "0001":"https://auth.mercadolivre.com.br/authorization?response_type=code&client_id=000000000000000&redirect_uri=""
-    "0002": "https://auth.mercadolivre.com.br/authorization?response_type=code&client_id=000000000000000&redirect_uri=""
-    "0003": "https://auth.mercadolivre.com.br/authorization?response_type=code&client_id=000000000000000&redirect_uri=""
-    "0004": "https://auth.mercadolivre.com.br/authorization?response_type=code&client_id=000000000000000&redirect_uri=""
-}
-
-username = {"0001", "0002", "0003", "0004"}
-
-intentions = {
-    "Frete": "frete; envio;",
-    "Entrega": "prazo de entrega; quando chega; tempo para entregar; status da entrega; acompanhar pedido, não chegou",
-    "Preço": "preço; custa; custo; valor",
-    "Duvida sobre o produto": "cor, cores, tamanho, profundidade, cm, mm, medidas, diametro,montagem, vem montado",
-    "Estoque": "disponível; estoque; disponibilidade; quantidade",
-    "Pagamento": "pagamento;pagar",
-    "Garantia": "garantia;",
-    "Devoluçao": "devolução;devolver;retorno;",
-    "Suporte": "suporte; ajuda; atendimento; falar com; falar com o vendedor;mensagens; reclamar: reclamação",
-    "Problemas com a Compra": "errado; quebrado; problema; defeituoso; quebrado; peças faltando; falta; faltou; não veio; não entregou, atraso ",
-    "Variações do produto?":"Vocês fazem tal atura?; Tem com as medidas x?; Poderia fazer; Tem outro anúncio; "
-  }  
-
-prompts = [
-    {
-        "Saudação": ""
-    },
-    {
-        "Frete": ""
-    },
-    {
-        "Entrega": ""
-    },
-    {
-        "Preço": ""
-    },
-    {
-        "Estoque": ""
-    },
-    {
-        "Garantia": ""
-    },
-    {
-        "Devolução": ""
-    },
-    {
-        "Suporte": ""
-    },
-    {
-        "Problemas com a Compra": ""
-    },
-    {
-        "Variações do produto": ""
-    },
-]
+redirect_urls = {
+    "0001":"https://auth.mercadolivre.com.br/authorization?response_type=code&client_id=000000000000000&redirect_uri=""
+    "0002": "https://auth.mercadolivre.com.br/authorization?response_type=code&client_id=000000000000000&redirect_uri=""
+    "0003": "https://auth.mercadolivre.com.br/authorization?response_type=code&client_id=000000000000000&redirect_uri=""
+    "0004": "https://auth.mercadolivre.com.br/authorization?response_type=code&client_id=000000000000000&redirect_uri=""
+}
+
+username = {"0001", "0002", "0003", "0004"}
+
+intentions = {
+    "Frete": "frete; envio;",
+    "Entrega": "prazo de entrega; quando chega; tempo para entregar; status da entrega; acompanhar pedido, não chegou",
+    "Preço": "preço; custa; custo; valor",
+    "Duvida sobre o produto": "cor, cores, tamanho, profundidade, cm, mm, medidas, diametro,montagem, vem montado",
+    "Estoque": "disponível; estoque; disponibilidade; quantidade",
+    "Pagamento": "pagamento;pagar",
+    "Garantia": "garantia;",
+    "Devoluçao": "devolução;devolver;retorno;",
+    "Suporte": "suporte; ajuda; atendimento; falar com; falar com o vendedor;mensagens; reclamar: reclamação",
+    "Problemas com a Compra": "errado; quebrado; problema; defeituoso; quebrado; peças faltando; falta; faltou; não veio; não entregou, atraso ",
+    "Variações do produto?":"Vocês fazem tal atura?; Tem com as medidas x?; Poderia fazer; Tem outro anúncio; "
+  }  
+
+prompts = [
+    {
+        "Saudação": ""
+    },
+    {
+        "Frete": ""
+    },
+    {
+        "Entrega": ""
+    },
+    {
+        "Preço": ""
+    },
+    {
+        "Estoque": ""
+    },
+    {
+        "Garantia": ""
+    },
+    {
+        "Devolução": ""
+    },
+    {
+        "Suporte": ""
+    },
+    {
+        "Problemas com a Compra": ""
+    },
+    {
+        "Variações do produto": ""
+    },
+]
@@ -0,0 +1,136 @@
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+
+class KeyedWorkerPool:
+    # Pool de threads que processa chaves diferentes em paralelo, mas mantém
+    # a ordem (e a exclusão mútua) entre os itens de uma mesma chave.
+    # Se o handler devolver um Future (trabalho agendado num event loop), o worker
+    # fica livre na hora e a chave só é liberada quando o Future terminar.
+
+    def __init__(self, handler, key_func, num_workers=4, name='worker'):
+        self.handler = handler
+        self.key_func = key_func
+        self.num_workers = max(1, int(num_workers))
+        self.name = name
+
+        self._cond = threading.Condition()
+        self._pending = {}        # chave -> deque de itens aguardando
+        self._ready = deque()     # chaves com itens e sem worker ativo
+        self._active = set()      # chaves sendo processadas neste momento
+        self._size = 0
+        self._closed = False
+        self._threads = []
+
+    def start(self):
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"{self.num_workers} workers iniciados para {self.name}")
+        return self
+
+    def put(self, item):
+        key = self.key_func(item)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Pool de workers encerrado, item recusado")
+            items = self._pending.get(key)
+            if items is None:
+                items = self._pending[key] = deque()
+                if key not in self._active:
+                    self._ready.append(key)
+            items.append(item)
+            self._size += 1
+            self._cond.notify()
+
+    def qsize(self):
+        with self._cond:
+            return self._size
+
+    def _next(self):
+        with self._cond:
+            while not self._ready:
+                # Encerrado e sem nada pendente: o worker pode sair
+                if self._closed and not self._pending:
+                    return None, None
+                self._cond.wait()
+            key = self._ready.popleft()
+            items = self._pending[key]
+            item = items.popleft()
+            if not items:
+                del self._pending[key]
+            self._active.add(key)
+            return key, item
+
+    def _done(self, key):
+        with self._cond:
+            self._active.discard(key)
+            self._size -= 1
+            if key in self._pending:
+                self._ready.append(key)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            key, item = self._next()
+            if item is None:
+                break
+            result = None
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                logger.error(f"Erro não tratado no worker para a chave {key}: {e}")
+                traceback.print_exc()
+            finally:
+                if not isinstance(result, Future):
+                    self._done(key)
+            if isinstance(result, Future):
+                result.add_done_callback(partial(self._future_done, key))
+
+    def _future_done(self, key, future):
+        try:
+            if not future.cancelled() and future.exception() is not None:
+                logger.error(f"Erro não tratado no worker para a chave {key}: {future.exception()}")
+        finally:
+            self._done(key)
+
+    def join(self, timeout=None):
+        # Aguarda até que todos os itens enfileirados tenham sido processados
+        with self._cond:
+            return self._cond.wait_for(lambda: self._size == 0, timeout)
+
+    def shutdown(self, wait=True, timeout=None):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        logger.info(f"Encerrando {self.name}, itens pendentes: {self.qsize()}")
+        if wait:
+            # Um único prazo para o pool inteiro, não timeout por thread
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for thread in self._threads:
+                thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            alive = sum(1 for thread in self._threads if thread.is_alive())
+            if alive:
+                logger.warning(f"{alive} workers de {self.name} ainda ativos após {timeout}s")
+            # Itens agendados (Future) podem continuar depois que os workers saem
+            if not self.join(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                logger.warning(f"{self.qsize()} itens de {self.name} ainda em andamento após {timeout}s")
@@ -0,0 +1,69 @@
+import json
+import os
+import threading
+import time
+import logging
+import sys
+from dotenv import load_dotenv
+
+# Os números do processamento (classificador, pool do banco, limites, disjuntores,
+# métricas) vivem no processo que consome a fila (worker.py). Ele grava um retrato
+# periódico num arquivo, lido pelas rotas /queue_size e /metrics do Flask sem que
+# o Flask precise importar (e iniciar) o consumidor.
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+load_dotenv()
+
+WORKER_STATS_PATH = os.getenv('WORKER_STATS_PATH', 'worker_stats.json')
+WORKER_STATS_INTERVAL = float(os.getenv('WORKER_STATS_INTERVAL', '5'))
+
+
+def write_worker_stats(snapshot):
+    # Arquivo temporário + os.replace: quem lê nunca vê um JSON pela metade
+    payload = dict(snapshot, updated_at=time.time(), pid=os.getpid())
+    tmp_path = f'{WORKER_STATS_PATH}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, WORKER_STATS_PATH)
+
+
+def read_worker_stats():
+    # None se o consumidor ainda não publicou nada; 'stats_age' diz há quantos segundos
+    try:
+        with open(WORKER_STATS_PATH, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Erro ao ler {WORKER_STATS_PATH}: {e}")
+        return None
+    snapshot['stats_age'] = max(0.0, time.time() - snapshot.get('updated_at', 0))
+    return snapshot
+
+
+def start_publisher(collect, stop_event):
+    # collect() devolve o dicionário publicado; roda até stop_event e publica uma última vez
+    def run():
+        while True:
+            stopping = stop_event.wait(WORKER_STATS_INTERVAL)
+            try:
+                write_worker_stats(collect())
+            except Exception as e:
+                logger.error(f"Erro ao publicar as estatísticas do worker: {e}")
+            if stopping:
+                return
+
+    thread = threading.Thread(target=run, name='worker-stats', daemon=True)
+    thread.start()
+    return thread
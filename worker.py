@@ -0,0 +1,40 @@
+import signal
+import threading
+import logging
+import sys
+
+# Consumidor da fila de notificações sem o servidor Flask, para rodar ao lado
+# do servidor de ingestão (asgi.py):
+#
+#   python worker.py
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+stderr_handler = logging.StreamHandler(sys.stderr)
+stderr_handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+stderr_handler.setFormatter(formatter)
+logger.addHandler(stderr_handler)
+
+if len(logger.handlers) > 1:
+    logger.handlers = [stderr_handler]
+
+# A importação inicia o dispatcher e os workers; o encerramento drena a fila
+import tools.notification  # noqa: E402,F401
+
+stop = threading.Event()
+
+
+def handle_signal(signum, frame):
+    logger.info(f"Sinal {signum} recebido, encerrando")
+    stop.set()
+
+
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    logger.info("Consumidor de notificações iniciado")
+    stop.wait()
+    # Drena antes de o interpretador encerrar os executores do concurrent.futures
+    tools.notification.shutdown_notification_workers()